@@ -0,0 +1,98 @@
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from backend.utils.columnar_store import export_columnar, ColumnarReservations
+
+SOURCE_FILE = 'backend/data/processed_output.json'
+TARGET_RESERVATIONS = 200_000  # Roughly a few hundred MB of JSON
+EXTRA_DIETARY_TAGS = 150  # Free-text tags from the LLM; more than fit in one 64-bit word
+
+def build_synthetic_data(source_file: str, target: int) -> dict:
+    """
+    Replicate the processed output to `target` reservations with shuffled dates and guests,
+    adding free-text dietary tags so the tag vocabulary spans several bitset words.
+    """
+    with open(source_file, 'r') as f:
+        source = json.load(f)
+
+    rng = random.Random(0)
+    reservations = []
+    while len(reservations) < target:
+        for reservation in source['reservations']:
+            copy = dict(reservation)
+            copy['date'] = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            copy['number_of_guests'] = rng.randint(1, 8)
+            copy['food_ordered'] = [
+                {**order, 'dietary_tags': order['dietary_tags'] + [f"no ingredient {rng.randrange(EXTRA_DIETARY_TAGS)}"]}
+                if rng.random() < 0.3 else order
+                for order in reservation['food_ordered']
+            ]
+            reservations.append(copy)
+    return {'metadata': source['metadata'], 'reservations': reservations[:target]}
+
+def json_aggregates(json_file: Path) -> dict:
+    """Baseline: json.load plus Python loops."""
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+
+    revenue_per_day = defaultdict(float)
+    dietary_counts = defaultdict(int)
+    total_guests = 0
+    vip = 0
+    for reservation in data['reservations']:
+        total_guests += reservation['number_of_guests']
+        vip += reservation['is_vip']
+        for order in reservation['food_ordered']:
+            revenue_per_day[reservation['date']] += order['price'] * order['quantity']
+            for tag in order['dietary_tags']:
+                dietary_counts[tag] += order['quantity']
+    return {'revenue_per_day': revenue_per_day, 'dietary_counts': dietary_counts,
+            'total_guests': total_guests, 'vip': vip}
+
+def columnar_aggregates(directory: Path) -> dict:
+    """Memory-mapped columns plus vectorized aggregates."""
+    store = ColumnarReservations(directory)
+    return {'revenue_per_day': store.revenue_per_day(),
+            'dietary_counts': store.dietary_tag_counts(),
+            'total_guests': int(store['number_of_guests'].sum()),
+            'vip': int(store['is_vip'].sum())}
+
+def timed(label: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f"{label:<32} {time.perf_counter() - start:8.3f}s")
+    return result
+
+def main():
+    data = build_synthetic_data(SOURCE_FILE, TARGET_RESERVATIONS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = Path(tmp) / 'processed_output.json'
+        columnar_dir = Path(tmp) / 'columnar'
+        with open(json_file, 'w') as f:
+            json.dump(data, f)
+        del data
+
+        print(f"Reservations: {TARGET_RESERVATIONS}")
+        print(f"JSON size: {json_file.stat().st_size / 1e6:.1f} MB")
+        with open(json_file, 'r') as f:
+            timed("Export to columnar", export_columnar, json.load(f), columnar_dir)
+        columnar_size = sum(p.stat().st_size for p in columnar_dir.iterdir())
+        print(f"Columnar size: {columnar_size / 1e6:.1f} MB")
+
+        baseline = timed("json.load + Python loops", json_aggregates, json_file)
+        columnar = timed("mmap + vectorized aggregates", columnar_aggregates, columnar_dir)
+
+        # Sanity check that both paths agree
+        assert baseline['total_guests'] == columnar['total_guests']
+        assert baseline['vip'] == columnar['vip']
+        assert dict(baseline['dietary_counts']) == columnar['dietary_counts']
+        for day, revenue in baseline['revenue_per_day'].items():
+            assert abs(revenue - columnar['revenue_per_day'][day]) < 1e-6 * max(revenue, 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import itertools
+import json
+import random
+import time
+
+from backend.utils.seating_optimizer import FloorPlan, Table, SeatingOptimizer
+
+NIGHTS = 5
+PARTIES_PER_NIGHT = 160  # ~550 covers
+PREFERENCES = [
+    "Prefers a quiet corner table",
+    "Loves the window seats",
+    "Enjoys a cozy booth",
+    "Requested a private room for the celebration",
+    "Table with easy wheelchair access",
+    "Appreciates generous portion sizes",
+]
+
+def build_floor_plan() -> FloorPlan:
+    """A 64-table dining room with pushable 2-tops and 4-tops."""
+    tables = []
+    for i in range(24):
+        features = {"window"} if i < 6 else ({"quiet", "corner"} if i >= 20 else set())
+        if i % 4 == 0:
+            features |= {"accessible"}
+        tables.append(Table(f"T2-{i}", 2, features))
+    for i in range(24):
+        features = {"booth"} if i < 5 else ({"quiet"} if i >= 20 else set())
+        if i % 3 == 0:
+            features |= {"accessible"}
+        tables.append(Table(f"T4-{i}", 4, features))
+    for i in range(12):
+        tables.append(Table(f"T6-{i}", 6, {"accessible"} if i % 2 == 0 else set()))
+    for i in range(4):
+        tables.append(Table(f"P8-{i}", 8, {"private", "quiet", "accessible"}))
+
+    combinations = [[f"T2-{i}", f"T2-{i + 1}"] for i in range(0, 24, 2)]
+    combinations += [[f"T4-{i}", f"T4-{i + 1}"] for i in range(0, 24, 2)]
+    combinations += [[f"T4-{i}", f"T4-{i + 1}", f"T4-{i + 2}"] for i in range(0, 22, 3)]
+    return FloorPlan(tables=tables, combinations=combinations, service_start="17:00", service_end="23:30")
+
+def synthetic_night(rng: random.Random, date: str, with_times: bool) -> list:
+    """A night of reservations; without times they look like ReservationOutput, which has none."""
+    reservations = []
+    for i in range(PARTIES_PER_NIGHT):
+        size = rng.choices([1, 2, 3, 4, 5, 6, 8, 10], weights=[2, 40, 10, 25, 6, 8, 5, 2])[0]
+        reservations.append({
+            "client_name": f"Guest {i}",
+            "source_id": f"{date}-{i}",
+            "number_of_guests": size,
+            "date": date,
+            "is_vip": rng.random() < 0.05,
+            "food_ordered": [],
+            "special_requests": rng.sample(PREFERENCES, k=rng.randint(0, 1)),
+            "preferences": rng.sample(PREFERENCES, k=rng.randint(0, 2)),
+        })
+        if with_times:
+            reservations[-1]["time"] = f"{rng.randint(17, 21)}:{rng.choice(['00', '15', '30', '45'])}"
+    return reservations
+
+def check_no_double_booking(plan):
+    bookings = {}
+    for assignment in plan.assignments.values():
+        for table_id in assignment.table_ids:
+            bookings.setdefault(table_id, []).append((assignment.start, assignment.end))
+    for intervals in bookings.values():
+        intervals.sort()
+        for (_, end), (start, _) in zip(intervals, intervals[1:]):
+            assert end <= start, "Table double booked"
+
+def main():
+    rng = random.Random(0)
+    optimizer = SeatingOptimizer(build_floor_plan())
+
+    for night, with_times in itertools.product(range(NIGHTS), (True, False)):
+        date = f"2024-12-{night + 10}"
+        reservations = synthetic_night(rng, date, with_times)
+        covers = sum(r["number_of_guests"] for r in reservations)
+
+        start = time.perf_counter()
+        plan = optimizer.solve(reservations, date=date)
+        solve_time = time.perf_counter() - start
+        check_no_double_booking(plan)
+
+        # Incremental re-solve: one party grows by two guests
+        changed = dict(reservations[rng.randrange(len(reservations))])
+        changed["number_of_guests"] += 2
+        start = time.perf_counter()
+        plan.update(optimizer.to_party(changed))
+        update_time = time.perf_counter() - start
+        check_no_double_booking(plan)
+
+        summary = plan.to_dict()
+        print(f"{date} ({'times' if with_times else 'no times'}): {covers} covers, {summary['seated_covers']} seated, "
+              f"{len(summary['unseated'])} parties unseated | "
+              f"solve {solve_time * 1000:.1f} ms, update {update_time * 1000:.2f} ms")
+
+    print(json.dumps(plan.to_dict()["assignments"][:3], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import asyncio
+import argparse
 import json
 from pathlib import Path
 import logging
 from utils.reservation_processor import ReservationProcessor
 from utils.llm.llm_wrapper import LanguageModelConfig
+from utils.columnar_store import export_columnar_file
 import shutil
 
 # Setup logging
@@ -13,7 +15,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def main():
+async def main(command: str = "process"):
     try:
         # Initialize processor
         processor = ReservationProcessor()
@@ -22,13 +24,25 @@ async def main():
         input_file = "backend/data/sample_reservations.json"
         processed_file = "backend/data/processed_output.json"
         frontend_file = "frontend/public/data/processed_output.json"
+        columnar_dir = "backend/data/columnar"
         
-        await processor.process_reservation_file(input_file, processed_file)
+        if command == "retry-failed":
+            # Reprocess only the diners in the dead-letter file and merge them into the output
+            await processor.retry_failed(processed_file)
+        else:
+            await processor.process_reservation_file(input_file, processed_file)
         
         # Copy to frontend
         Path(frontend_file).parent.mkdir(parents=True, exist_ok=True)
         Path(frontend_file).write_text(Path(processed_file).read_text())
         
+        # Columnar copy for analytics jobs; a failure here must not lose the processed output
+        try:
+            export_columnar_file(processed_file, columnar_dir)
+            logger.info(f"Columnar export saved to: {columnar_dir}")
+        except Exception as e:
+            logger.error(f"Columnar export failed, processed output is unaffected: {str(e)}")
+        
         logger.info("Processing pipeline complete")
         logger.info(f"Backend copy saved to: {processed_file}")
         logger.info(f"Frontend copy saved to: {frontend_file}")
@@ -38,8 +52,17 @@ async def main():
         raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process reservations with the LLM pipeline")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="process",
+        choices=["process", "retry-failed"],
+        help="'process' runs the full input file; 'retry-failed' retries only dead-lettered diners"
+    )
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.command))
     except KeyboardInterrupt:
         logger.info("Processing interrupted by user")
     except Exception as e:
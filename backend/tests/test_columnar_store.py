@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.utils.columnar_store import ColumnarReservations, export_columnar, export_columnar_file
+
+
+def reservation(name, date, guests, is_vip, orders, preferences=()):
+    return {
+        "client_name": name,
+        "number_of_guests": guests,
+        "date": date,
+        "food_ordered": [
+            {"item": item, "quantity": quantity, "dietary_tags": list(tags), "price": price}
+            for item, quantity, tags, price in orders
+        ],
+        "is_vip": is_vip,
+        "special_requests": [],
+        "preferences": list(preferences),
+    }
+
+
+@pytest.fixture
+def processed_data():
+    return {
+        "metadata": {"total_processed": 3},
+        "reservations": [
+            reservation("Ann", "2024-12-10", 2, False,
+                        [("Soup", 2, ["vegan", "gluten-free"], 10.0), ("Steak", 1, [], 40.0)],
+                        preferences=["Quiet table"]),
+            reservation("Ben", "2024-12-10", 4, True, [("Soup", 1, ["vegan"], 10.0)]),
+            reservation("Cleo", "2024-12-11", 3, False, [("Fish", 3, ["pescatarian"], 30.0)]),
+        ],
+    }
+
+
+@pytest.fixture
+def store(processed_data, tmp_path):
+    export_columnar(processed_data, tmp_path / "columnar")
+    return ColumnarReservations(tmp_path / "columnar")
+
+
+def test_round_trip_columns_and_strings(store):
+    assert len(store) == 3
+    assert store["number_of_guests"].tolist() == [2, 4, 3]
+    assert store["is_vip"].tolist() == [False, True, False]
+    assert store["order_offsets"].tolist() == [0, 2, 3, 4]
+    assert store.client_names() == ["Ann", "Ben", "Cleo"]
+    assert store.list_values("preferences", 0) == ["Quiet table"]
+    assert store.list_values("preferences", 1) == []
+    # "Soup" is stored once in the string table
+    assert store.meta["num_strings"] == len(set(store.strings(range(store.meta["num_strings"]))))
+    assert store["order_item"][0] == store["order_item"][2]
+
+
+def test_columns_are_memory_mapped(store):
+    assert isinstance(store["order_price"], np.memmap)
+
+
+def test_masks(store):
+    assert store.mask(date="2024-12-10").tolist() == [True, True, False]
+    assert store.mask(date_from="2024-12-11").tolist() == [False, False, True]
+    assert store.mask(is_vip=True).tolist() == [False, True, False]
+    assert store.mask(min_guests=3).tolist() == [False, True, True]
+    assert store.mask(dietary_tag="vegan", is_vip=False).tolist() == [True, False, False]
+    with pytest.raises(KeyError):
+        store.mask(dietary_tag="halal")
+
+
+def test_aggregates(store):
+    assert store.reservation_totals().tolist() == [60.0, 10.0, 90.0]
+    assert store.revenue_per_day() == {"2024-12-10": 70.0, "2024-12-11": 90.0}
+    assert store.guests_per_day(store.mask(is_vip=False)) == {"2024-12-10": 2, "2024-12-11": 3}
+    assert store.dietary_tag_counts() == {"vegan": 3, "gluten-free": 2, "pescatarian": 3}
+    assert store.summary(store.mask(date="2024-12-10")) == {
+        "reservations": 2,
+        "total_revenue": 70.0,
+        "total_guests": 6,
+        "vip_reservations": 1,
+        "dietary_tag_counts": {"vegan": 3, "gluten-free": 2, "pescatarian": 0},
+    }
+
+
+def test_more_than_64_dietary_tags(tmp_path):
+    tags = [f"tag {i}" for i in range(150)]
+    data = {"reservations": [
+        reservation(f"Guest {i}", "2024-12-10", 2, False, [("Dish", 1, [tag], 10.0)])
+        for i, tag in enumerate(tags)
+    ]}
+    export_columnar(data, tmp_path / "columnar")
+    store = ColumnarReservations(tmp_path / "columnar")
+
+    assert store["dietary_mask"].shape == (150, 3)
+    assert store.mask(dietary_tag="tag 0").nonzero()[0].tolist() == [0]
+    assert store.mask(dietary_tag="tag 149").nonzero()[0].tolist() == [149]
+    assert store.dietary_tag_counts() == {tag: 1 for tag in tags}
+
+
+def test_export_file_and_empty_output(tmp_path):
+    input_file = tmp_path / "processed_output.json"
+    input_file.write_text(json.dumps({"metadata": {}, "reservations": []}))
+    export_columnar_file(str(input_file), tmp_path / "columnar")
+    store = ColumnarReservations(tmp_path / "columnar")
+
+    assert len(store) == 0
+    assert store.revenue_per_day() == {}
+    assert store.summary()["total_revenue"] == 0.0
+
+
+def test_dates_without_zero_padding(tmp_path):
+    data = {"reservations": [reservation("Ann", "2024-1-5", 2, False, [("Soup", 1, [], 10.0)])]}
+    export_columnar(data, tmp_path / "columnar")
+    store = ColumnarReservations(tmp_path / "columnar")
+
+    assert store.guests_per_day() == {"2024-01-05": 2}
+    assert store.mask(date="2024-1-5").tolist() == [True]
+
+
+def test_reexport_replaces_directory_without_touching_open_readers(processed_data, tmp_path):
+    export_columnar(processed_data, tmp_path / "columnar")
+    old_store = ColumnarReservations(tmp_path / "columnar")
+
+    data = {"reservations": [reservation("Dan", "2024-12-12", 6, True, [("Cake", 1, [], 8.0)])]}
+    export_columnar(data, tmp_path / "columnar")
+    new_store = ColumnarReservations(tmp_path / "columnar")
+
+    assert old_store["number_of_guests"].tolist() == [2, 4, 3]
+    assert old_store.client_names() == ["Ann", "Ben", "Cleo"]
+    assert new_store["number_of_guests"].tolist() == [6]
+    assert new_store.client_names() == ["Dan"]
+    # No temporary or replaced directories are left behind
+    assert [path.name for path in tmp_path.iterdir()] == ["columnar"]
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from backend.utils.llm.llm_wrapper import (
+    HedgeSettings, HedgeTracker, LanguageModel, LanguageModelConfig, percentile
+)
+
+
+class Item(BaseModel):
+    item_id: str
+
+
+class EchoChatModel:
+    """Replies with the item id found in the prompt and records the event loop of each call."""
+
+    def __init__(self):
+        self.loops = set()
+
+    async def ainvoke(self, prompt):
+        self.loops.add(id(asyncio.get_running_loop()))
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(content=json.dumps({"item_id": re.search(r"item-\d+", prompt).group(0)}))
+
+
+def make_echo_model(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    model = LanguageModel(LanguageModelConfig(use_async=True), structured_output=Item)
+    model.model = EchoChatModel()
+    return model
+
+
+def test_bulk_responses_keep_input_order_and_errors(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    model = LanguageModel(LanguageModelConfig(use_async=True))
+
+    async def fake_response(prompt):
+        if prompt == "bad":
+            raise ValueError("bad prompt")
+        await asyncio.sleep(0.01)
+        return prompt.upper()
+
+    model.a_get_structured_response = fake_response
+    try:
+        results = model.get_structured_responses(["a", "bad", "c"], max_concurrency=2)
+    finally:
+        model.close()
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+
+
+def test_sync_response_from_worker_threads_shares_one_loop(monkeypatch):
+    model = make_echo_model(monkeypatch)
+    prompts = [f"Look up item-{i}" for i in range(16)]
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(model.get_structured_response, prompts))
+    finally:
+        model.close()
+    assert [result.item_id for result in results] == [f"item-{i}" for i in range(16)]
+    assert len(model.model.loops) == 1
+
+
+def test_sync_response_from_inside_running_event_loop(monkeypatch):
+    model = make_echo_model(monkeypatch)
+
+    async def caller():
+        # Blocking call made by sync code that happens to run inside an event loop
+        return model.get_structured_response("Look up item-7"), id(asyncio.get_running_loop())
+
+    try:
+        result, caller_loop = asyncio.run(caller())
+    finally:
+        model.close()
+    assert result.item_id == "item-7"
+    assert caller_loop not in model.model.loops
+
+
+class FakeChatModel:
+    """Returns the prompt after the delay scheduled for each successive call."""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return SimpleNamespace(content=prompt)
+
+
+def make_model(monkeypatch, delays, **config):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    model = LanguageModel(LanguageModelConfig(use_async=True, hedge_requests=True, **config))
+    model.model = FakeChatModel(delays)
+    return model
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 99) is None
+
+
+def test_threshold_uses_initial_delay_until_enough_samples():
+    tracker = HedgeTracker()
+    for _ in range(HedgeSettings.MIN_SAMPLES - 1):
+        tracker.record_attempt(1.0)
+    assert tracker.threshold(95, initial_delay=5) == 5
+    tracker.record_attempt(1.0)
+    assert tracker.threshold(95, initial_delay=5) == 1.0
+
+
+def test_hedge_budget_is_shared_through_state_file(tmp_path):
+    state_file = tmp_path / "hedge_state.json"
+    first, second = HedgeTracker(str(state_file)), HedgeTracker(str(state_file))
+    no_rate_limit = lambda: 0
+    for _ in range(3):
+        first.begin_request(95, initial_delay=5)
+
+    assert first.reserve_hedge(2, 1.0, no_rate_limit)
+    assert second.reserve_hedge(2, 1.0, no_rate_limit)
+    assert not first.reserve_hedge(2, 1.0, no_rate_limit)
+    assert second.stats()["hedges_fired"] == 2
+    assert second.stats()["hedges_skipped"] == 1
+
+
+def test_hedges_are_capped_at_a_fraction_of_recent_requests():
+    tracker = HedgeTracker()
+    no_rate_limit = lambda: 0
+    for _ in range(9):
+        tracker.begin_request(95, initial_delay=5)
+    assert not tracker.reserve_hedge(100, 0.1, no_rate_limit)
+
+    tracker.begin_request(95, initial_delay=5)
+    assert tracker.reserve_hedge(100, 0.1, no_rate_limit)
+    assert not tracker.reserve_hedge(100, 0.1, no_rate_limit)
+
+
+def test_reading_threshold_and_stats_leaves_state_file_untouched(tmp_path):
+    state_file = tmp_path / "hedge_state.json"
+    tracker = HedgeTracker(str(state_file))
+    assert tracker.threshold(95, initial_delay=5) == 5
+    assert tracker.stats()["requests"] == 0
+    assert not state_file.exists()
+
+    tracker.record_attempt(1.0)
+    written = state_file.read_text()
+    tracker.threshold(95, initial_delay=5)
+    tracker.stats()
+    assert state_file.read_text() == written
+
+
+def test_latency_samples_are_shared_through_state_file(tmp_path):
+    state_file = tmp_path / "hedge_state.json"
+    for _ in range(HedgeSettings.MIN_SAMPLES):
+        HedgeTracker(str(state_file)).record_attempt(2.0)
+    assert HedgeTracker(str(state_file)).threshold(95, initial_delay=5) == 2.0
+
+
+def test_hedge_wins_and_cancelled_primary_is_recorded(monkeypatch):
+    model = make_model(monkeypatch, [1.0, 0.01], hedge_initial_delay=0.05,
+                       hedge_max_fraction=1.0, hedge_control_fraction=0)
+
+    assert asyncio.run(model._ainvoke_hedged("hi")).content == "hi"
+
+    stats = model.get_hedge_stats()
+    assert stats["requests"] == 1
+    assert stats["hedges_fired"] == 1
+    assert stats["hedge_wins"] == 1
+    # The cancelled primary keeps the tail in the threshold samples
+    assert max(model._hedge_tracker._state["attempt_latencies"]) >= 0.05
+    # No control requests measured yet
+    assert stats["p99_latency_unhedged"] is None
+    assert stats["p99_improvement"] is None
+
+
+def test_control_requests_are_not_hedged(monkeypatch):
+    model = make_model(monkeypatch, [0.2], hedge_initial_delay=0.01,
+                       hedge_max_fraction=1.0, hedge_control_fraction=1.0)
+    asyncio.run(model._ainvoke_hedged("hi"))
+
+    stats = model.get_hedge_stats()
+    assert stats["control_requests"] == 1
+    assert stats["hedges_fired"] == 0
+    assert model.model.calls == 1
+    assert model._hedge_tracker._state["control_latencies"][0] >= 0.2
+
+
+def test_p99_improvement_is_measured_against_control_requests():
+    tracker = HedgeTracker()
+    for _ in range(HedgeSettings.MIN_SAMPLES - 1):
+        tracker.record_request(4.0, [4.0], control=True)
+        tracker.record_request(1.0, [1.0, 3.0], hedge_won=True)
+    assert tracker.stats()["p99_improvement"] is None
+
+    tracker.record_request(4.0, [4.0], control=True)
+    stats = tracker.stats()
+    assert stats["p99_latency_unhedged"] == 4.0
+    assert stats["p99_latency"] == 1.0
+    assert stats["p99_improvement"] == pytest.approx(3.0)
+
+
+def test_no_hedge_when_primary_is_fast(monkeypatch):
+    model = make_model(monkeypatch, [0.01], hedge_initial_delay=0.5, hedge_control_fraction=0)
+    asyncio.run(model._ainvoke_hedged("hi"))
+
+    stats = model.get_hedge_stats()
+    assert stats["hedges_fired"] == 0
+    assert stats["hedge_rate"] == 0.0
+    assert model.model.calls == 1
+
+
+def test_file_backed_request_updates_shared_state(monkeypatch, tmp_path):
+    state_file = tmp_path / "hedge_state.json"
+    model = make_model(monkeypatch, [0.01], hedge_initial_delay=0.5, hedge_control_fraction=0,
+                       hedge_state_file=str(state_file))
+    asyncio.run(model._ainvoke_hedged("hi"))
+
+    stats = HedgeTracker(str(state_file)).stats()
+    assert stats["requests"] == 1
+    assert stats["p99_latency"] is not None
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import subprocess
+import sys
+from dataclasses import replace
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APITimeoutError, RateLimitError
+
+from backend.utils import reservation_processor as rp
+from backend.utils.llm.llm_wrapper import LanguageModelConfig
+from backend.utils.reservation_processor import (
+    FailureCategory, InputSchemaError, ReservationProcessor, categorize_failure, dead_letter_path,
+    read_dead_letters, validate_diner
+)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def rate_limit_error():
+    return RateLimitError("429", response=httpx.Response(429, request=REQUEST), body=None)
+
+
+class FakeLLM:
+    """Fails diners whose name is in `failures` with the mapped exception, succeeds otherwise."""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    async def a_get_structured_response(self, prompt):
+        name = prompt.split("Name: ")[1].split("\n")[0]
+        if name in self.failures:
+            raise self.failures[name]()
+        return SimpleNamespace(dict=lambda: {"client_name": name, "number_of_guests": 2})
+
+
+def diner(name):
+    return {"name": name, "reviews": [], "emails": [], "reservations": []}
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(rp.ProcessingConfig, "BATCH_DELAY", 0)
+    monkeypatch.setattr(rp, "RETRY_POLICIES", {
+        category: replace(policy, batch_delay=0) for category, policy in rp.RETRY_POLICIES.items()
+    })
+    return ReservationProcessor(LanguageModelConfig(use_async=True, max_retries=1))
+
+
+@pytest.mark.parametrize("error, category", [
+    (InputSchemaError("bad"), FailureCategory.INPUT_SCHEMA),
+    (rate_limit_error(), FailureCategory.RATE_LIMIT),
+    (APITimeoutError(request=REQUEST), FailureCategory.TIMEOUT),
+    (asyncio.TimeoutError(), FailureCategory.TIMEOUT),
+    (ValueError("Failed to parse LLM response"), FailureCategory.PARSE_VALIDATION),
+    (RuntimeError("boom"), FailureCategory.UNKNOWN),
+])
+def test_categorize_failure(error, category):
+    assert categorize_failure(error) == category
+
+
+def test_validate_diner():
+    validate_diner(diner("Ann"))
+    for bad in ["Ann", {"reviews": [], "emails": []}, {"name": "Ann", "emails": []},
+                {**diner("Ann"), "reservations": "tonight"}]:
+        with pytest.raises(InputSchemaError):
+            validate_diner(bad)
+
+
+def test_source_id_is_stable_across_processes():
+    code = ("from backend.utils.reservation_processor import ReservationProcessor;"
+            "print(ReservationProcessor._source_id({'name': 'Ann', 'reviews': [{'rating': 5}]}))")
+    ids = {subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                          cwd=Path(__file__).resolve().parents[2]).stdout
+           for _ in range(2)}
+    assert len(ids) == 1
+    assert ids.pop().strip() == ReservationProcessor._source_id({"reviews": [{"rating": 5}], "name": "Ann"})
+
+
+def test_retry_timeout_is_never_lowered(processor):
+    timeout_policy = rp.RETRY_POLICIES[FailureCategory.TIMEOUT]
+    assert processor._retry_timeout(timeout_policy) == rp.ProcessingConfig.DEFAULT_CLIENT_TIMEOUT * 2
+
+    processor.model_config.timeout = 30
+    assert processor._retry_timeout(timeout_policy) == 60
+    assert processor._retry_timeout(rp.RetryPolicy(max_attempts=2, timeout_multiplier=0.5)) == 30
+
+
+def test_failures_are_dead_lettered_then_retried_and_merged(processor, tmp_path):
+    input_file, output_file = tmp_path / "input.json", tmp_path / "output.json"
+    input_file.write_text(json.dumps({"diners": [
+        diner("Ann"), diner("Ben"), diner("Cleo"), diner("Dan"), {"name": "Eve"}
+    ]}))
+    processor.llm = FakeLLM({
+        "Ben": rate_limit_error,
+        "Cleo": lambda: APITimeoutError(request=REQUEST),
+        "Dan": lambda: ValueError("Failed to parse"),
+    })
+    asyncio.run(processor.process_reservation_file(str(input_file), str(output_file)))
+
+    metadata = json.loads(output_file.read_text())["metadata"]
+    assert (metadata["total_processed"], metadata["successful"], metadata["failed"]) == (5, 1, 4)
+    assert metadata["failures_by_category"] == {
+        "rate_limit": 1, "timeout": 1, "parse_validation": 1, "input_schema": 1
+    }
+    assert metadata["failure_rates"]["timeout"] == pytest.approx(0.2)
+    entries = read_dead_letters(dead_letter_path(str(output_file)))
+    assert {e["diner"].get("name") for e in entries} == {"Ben", "Cleo", "Dan", "Eve"}
+    assert all(e["attempts"] == 1 and e["error"] for e in entries)
+
+    # Retry with a healthy model: only Eve's malformed input still fails
+    processor.llm = FakeLLM({})
+    processor._llm_for_policy = lambda policy: processor.llm
+    asyncio.run(processor.retry_failed(str(output_file)))
+
+    processed = json.loads(output_file.read_text())
+    metadata = processed["metadata"]
+    assert (metadata["successful"], metadata["failed"], metadata["retried"]) == (4, 1, 4)
+    assert metadata["failures_by_category"] == {"input_schema": 1}
+    assert sorted(r["client_name"] for r in processed["reservations"]) == ["Ann", "Ben", "Cleo", "Dan"]
+    remaining = read_dead_letters(dead_letter_path(str(output_file)))
+    assert [(e["diner"], e["attempts"]) for e in remaining] == [({"name": "Eve"}, 2)]
+
+
+def test_retry_replaces_stale_copy_and_skips_exhausted(processor, tmp_path):
+    output_file = tmp_path / "output.json"
+    source_id = ReservationProcessor._source_id(diner("Ann"))
+    output_file.write_text(json.dumps({
+        "metadata": {"total_processed": 2, "successful": 0, "failed": 2, "input_file": None},
+        "reservations": [{"client_name": "stale", "source_id": source_id}],
+    }))
+    dead_letters = [
+        {"source_id": source_id, "category": "timeout", "attempts": 1, "diner": diner("Ann")},
+        {"source_id": "x", "category": "unknown", "attempts": 2, "diner": diner("Zed")},
+    ]
+    dead_letter_path(str(output_file)).write_text("\n".join(json.dumps(e) for e in dead_letters))
+
+    processor.llm = FakeLLM({})
+    processor._llm_for_policy = lambda policy: processor.llm
+    asyncio.run(processor.retry_failed(str(output_file)))
+
+    processed = json.loads(output_file.read_text())
+    assert [r["client_name"] for r in processed["reservations"]] == ["Ann"]
+    assert processed["metadata"]["failed"] == 1
+    # Zed reached the unknown policy's max_attempts and was left untouched
+    assert [e["diner"]["name"] for e in read_dead_letters(dead_letter_path(str(output_file)))] == ["Zed"]
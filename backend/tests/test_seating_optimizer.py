@@ -0,0 +1,188 @@
+from dataclasses import replace
+
+import pytest
+
+from backend.utils.llm.schemas import ReservationOutput
+from backend.utils.seating_optimizer import (
+    FloorPlan, SeatingOptimizer, SeatingPlan, Table, _IntervalIndex, extract_table_preferences
+)
+
+
+def make_reservation(key, guests, time="18:00", is_vip=False, preferences=(), special_requests=()):
+    return {
+        "source_id": key,
+        "client_name": key,
+        "number_of_guests": guests,
+        "date": "2024-12-10",
+        "time": time,
+        "is_vip": is_vip,
+        "food_ordered": [],
+        "preferences": list(preferences),
+        "special_requests": list(special_requests),
+    }
+
+
+def assert_no_double_booking(plan):
+    bookings = {}
+    for assignment in plan.assignments.values():
+        for table_id in assignment.table_ids:
+            bookings.setdefault(table_id, []).append((assignment.start, assignment.end))
+    for intervals in bookings.values():
+        intervals.sort()
+        for (_, end), (start, _) in zip(intervals, intervals[1:]):
+            assert end <= start
+
+
+@pytest.fixture
+def floor_plan():
+    return FloorPlan(
+        tables=[
+            Table("A", 2, {"window"}),
+            Table("B", 2, {"quiet", "corner"}),
+            Table("C", 4, {"accessible"}),
+            Table("D", 4),
+        ],
+        combinations=[["A", "B"]],
+        service_start="17:00",
+        service_end="23:00",
+        turn_minutes=120,
+    )
+
+
+def test_interval_index_conflicts_and_overlaps():
+    index = _IntervalIndex()
+    index.add(1080, 1200, "late")
+    index.add(960, 1080, "early")
+
+    assert index.starts == [960, 1080]
+    assert index.keys == ["early", "late"]
+    assert not index.is_free(1000, 1100)
+    assert index.is_free(1200, 1300)  # Touching intervals do not conflict
+    assert index.overlapping(1070, 1090) == ["early", "late"]
+    assert index.overlapping(1200, 1300) == []
+
+    index.remove(960, 1080)
+    assert index.is_free(960, 1080)
+    assert index.keys == ["late"]
+
+
+@pytest.mark.parametrize("text, required, preferred", [
+    ("Secluded corner table", set(), {"private", "corner"}),
+    ("Prefers quieter dining environments", set(), {"quiet"}),
+    ("Quiet 'Happy Birthday' on a small dessert plate", set(), set()),
+    ("Likes spicy food (from Cajun Kitchen review)", set(), set()),
+    ("Inquired about special holiday menu preview", set(), set()),
+    ("Table with a view of the garden", set(), {"window"}),
+    ("Table with easy wheelchair access", {"accessible"}, set()),
+    ("Complained the old venue was inaccessible", set(), set()),
+])
+def test_extract_table_preferences(text, required, preferred):
+    assert extract_table_preferences({"preferences": [text], "special_requests": []}) == (required, preferred)
+
+
+def test_preferences_and_accessibility(floor_plan):
+    optimizer = SeatingOptimizer(floor_plan)
+    plan = optimizer.solve([
+        make_reservation("quiet", 2, preferences=["Prefers a quiet corner table"]),
+        make_reservation("window", 2, preferences=["Loves the window seats"]),
+        make_reservation("wheelchair", 3, special_requests=["Table with easy wheelchair access"]),
+    ])
+
+    assert plan.assignments["quiet"].table_ids == ("B",)
+    assert plan.assignments["window"].table_ids == ("A",)
+    assert plan.assignments["wheelchair"].table_ids == ("C",)
+    assert plan.unseated == []
+
+
+def test_vip_is_seated_first_and_later_turns_are_used(floor_plan):
+    optimizer = SeatingOptimizer(replace(floor_plan, turn_minutes=90))
+    reservations = [make_reservation(f"guest-{i}", 4) for i in range(3)]
+    reservations.append(make_reservation("vip", 4, is_vip=True))
+    plan = optimizer.solve(reservations)
+
+    assert plan.assignments["vip"].start == 18 * 60
+    # Two 4-tops and one 2+2 combination at 18:00, so the last party waits for the next turn
+    assert len(plan.assignments) == 4
+    assert plan.assignments["guest-2"].start == 18 * 60 + 90
+    assert_no_double_booking(plan)
+
+
+def test_augment_moves_a_seated_party(floor_plan):
+    plan = SeatingPlan(floor_plan)
+    optimizer = SeatingOptimizer(floor_plan)
+    # A party of 3 holds the accessible 4-top; a wheelchair party of 4 needs it
+    plan.solve([optimizer.to_party(make_reservation("three", 3, time="20:30"))])
+    assert plan.assignments["three"].table_ids == ("C",)
+
+    plan.update(optimizer.to_party(make_reservation(
+        "wheelchair", 4, time="20:30", special_requests=["Wheelchair Accessibility"]
+    )))
+    assert plan.assignments["wheelchair"].table_ids == ("C",)
+    assert plan.assignments["three"].table_ids == ("D",)
+    assert plan.assignments["three"].start == 20 * 60 + 30
+    assert_no_double_booking(plan)
+
+
+def test_update_and_remove_are_incremental(floor_plan):
+    optimizer = SeatingOptimizer(floor_plan)
+    plan = optimizer.solve([make_reservation(f"p{i}", 2, time="21:00") for i in range(5)])
+    assert plan.unseated == ["p4"]
+    untouched = {k: v for k, v in plan.assignments.items() if k != "p0"}
+
+    plan.remove("p0")
+    assert "p0" not in plan.assignments and "p0" not in plan.parties
+    plan.update(optimizer.to_party(make_reservation("p3", 4, time="21:00")))
+
+    # p4 takes the room freed by p0; parties not involved keep their tables
+    assert plan.unseated == []
+    assert "p4" in plan.assignments
+    for key in ("p1", "p2"):
+        assert plan.assignments[key] == untouched[key]
+    assert plan.to_dict()["seated_covers"] == 2 + 2 + 4 + 2
+    assert_no_double_booking(plan)
+
+
+def test_night_without_requested_times_uses_every_turn(floor_plan):
+    optimizer = SeatingOptimizer(floor_plan)
+    reservations = []
+    for i in range(9):
+        reservation = make_reservation(f"g{i}", 4)
+        del reservation["time"]
+        reservations.append(reservation)
+    plan = optimizer.solve(reservations)
+
+    # Three units seat four (C, D and A+B) and service fits three 120-minute turns
+    assert plan.unseated == []
+    assert sorted({a.start for a in plan.assignments.values()}) == [17 * 60, 19 * 60, 21 * 60]
+    assert_no_double_booking(plan)
+
+
+def test_reservation_output_has_no_time_and_is_flexible(floor_plan):
+    reservation = ReservationOutput(client_name="Ann", number_of_guests=2, date="2024-12-10",
+                                    is_vip=False, preferences=["Loves the window seats"])
+    party = SeatingOptimizer(floor_plan).to_party(reservation)
+
+    assert party.key == "Ann 2024-12-10"
+    assert party.flexible and party.start == 17 * 60
+    assert party.preferred == {"window"}
+
+
+def test_keys_are_rebuilt_by_to_party(floor_plan):
+    optimizer = SeatingOptimizer(floor_plan)
+    early, late, other_night = (make_reservation("Ann", 2, time=time) for time in ("18:00", "20:00", "18:00"))
+    for reservation in (early, late, other_night):
+        del reservation["source_id"]
+    other_night["date"] = "2024-12-11"
+    plan = optimizer.solve([early, late, other_night], date="2024-12-10")
+    assert sorted(plan.parties) == ["Ann 2024-12-10 18:00", "Ann 2024-12-10 20:00"]
+
+    plan.update(optimizer.to_party({**late, "number_of_guests": 4}))
+    assert len(plan.parties) == 2
+    assert plan.parties["Ann 2024-12-10 20:00"].size == 4
+    assert_no_double_booking(plan)
+
+
+def test_identical_duplicates_get_distinct_keys(floor_plan):
+    plan = SeatingOptimizer(floor_plan).solve([make_reservation("x", 2), make_reservation("x", 2)])
+
+    assert sorted(plan.parties) == ["x", "x#2"]
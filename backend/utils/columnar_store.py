@@ -0,0 +1,339 @@
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, Any, List, Optional, Iterable
+import logging
+from datetime import date as date_cls, datetime
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class ColumnarConfig:
+    """Layout constants for the columnar reservation store"""
+    FORMAT_VERSION = 2
+    META_FILE = "meta.json"
+    EPOCH = date_cls(1970, 1, 1)
+    BITS_PER_WORD = 64  # Dietary tag bitsets are uint64[rows, ceil(n_tags / 64)]
+
+# Column name -> dtype. Reservation-level columns have one row per reservation, order-level
+# columns one row per food order; list columns are stored CSR-style as <name>_offsets + <name>_ids.
+RESERVATION_COLUMNS = {
+    "client_name": np.int32,  # String table id
+    "number_of_guests": np.int32,
+    "date": np.int32,  # Days since 1970-01-01
+    "is_vip": np.bool_,
+    "order_offsets": np.int64,  # Orders of reservation i are order_offsets[i]:order_offsets[i + 1]
+}
+ORDER_COLUMNS = {
+    "order_item": np.int32,  # String table id
+    "order_price": np.float64,
+    "order_quantity": np.int32,
+    "order_reservation": np.int32,  # Row of the owning reservation
+}
+LIST_COLUMNS = ["special_requests", "preferences"]
+# 2-D uint64 bitset columns: tag t is bit t % 64 of word t // 64
+BITSET_COLUMNS = {
+    "dietary_mask": "reservation",  # OR of the dietary masks of the reservation's orders
+    "order_dietary_mask": "order",
+}
+
+class _StringTable:
+    """Deduplicating string table built while exporting"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: str) -> int:
+        if value not in self._ids:
+            self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return self._ids[value]
+
+    def to_arrays(self):
+        """Encode the table as one UTF-8 blob plus int64 offsets"""
+        encoded = [s.encode("utf-8") for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return blob, offsets
+
+def _date_to_int(value: str) -> int:
+    # Same format as the ReservationOutput validator, which also accepts e.g. 2024-1-5
+    return (datetime.strptime(value, '%Y-%m-%d').date() - ColumnarConfig.EPOCH).days
+
+def _int_to_date(value: int) -> str:
+    return str(np.datetime64(int(value), "D"))
+
+def _to_bitset(masks: List[int], num_words: int) -> np.ndarray:
+    """Split arbitrary-width Python int masks into a uint64[len(masks), num_words] array"""
+    bitset = np.zeros((len(masks), num_words), dtype=np.uint64)
+    word_mask = (1 << ColumnarConfig.BITS_PER_WORD) - 1
+    for row, mask in enumerate(masks):
+        word = 0
+        while mask:
+            bitset[row, word] = mask & word_mask
+            mask >>= ColumnarConfig.BITS_PER_WORD
+            word += 1
+    return bitset
+
+def _sibling_path(path: Path, label: str) -> Path:
+    """Unique hidden path next to `path`, on the same filesystem so renames stay atomic"""
+    return path.parent / f".{path.name}.{label}-{uuid.uuid4().hex}"
+
+def _replace_directory(source: Path, target: Path):
+    """Move source to target, replacing an existing target directory"""
+    if not target.exists():
+        os.replace(source, target)
+        return
+    old_path = _sibling_path(target, "old")
+    os.replace(target, old_path)
+    try:
+        os.replace(source, target)
+    except OSError:
+        os.replace(old_path, target)
+        raise
+    # Readers that already mapped the old columns keep them until they close
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def export_columnar(processed_data: Dict[str, Any], output_dir: str) -> Path:
+    """
+    Export processed reservations (the structure written by ReservationProcessor) into a
+    directory of .npy columns, a deduplicated string table and a small meta.json.
+    """
+    reservations = processed_data.get("reservations", [])
+    strings = _StringTable()
+    dietary_tags: Dict[str, int] = {}
+
+    def tag_mask(tags: Iterable[str]) -> int:
+        mask = 0
+        for tag in tags:
+            if tag not in dietary_tags:
+                dietary_tags[tag] = len(dietary_tags)
+            mask |= 1 << dietary_tags[tag]
+        return mask
+
+    columns: Dict[str, list] = {name: [] for name in {**RESERVATION_COLUMNS, **ORDER_COLUMNS, **BITSET_COLUMNS}}
+    columns["order_offsets"].append(0)
+    list_columns = {name: {"offsets": [0], "ids": []} for name in LIST_COLUMNS}
+
+    for row, reservation in enumerate(reservations):
+        reservation_mask = 0
+        for order in reservation.get("food_ordered", []):
+            order_mask = tag_mask(order.get("dietary_tags", []))
+            reservation_mask |= order_mask
+            columns["order_item"].append(strings.add(order["item"]))
+            columns["order_price"].append(order["price"])
+            columns["order_quantity"].append(order["quantity"])
+            columns["order_dietary_mask"].append(order_mask)
+            columns["order_reservation"].append(row)
+
+        columns["client_name"].append(strings.add(reservation["client_name"]))
+        columns["number_of_guests"].append(reservation["number_of_guests"])
+        columns["date"].append(_date_to_int(reservation["date"]))
+        columns["is_vip"].append(reservation["is_vip"])
+        columns["dietary_mask"].append(reservation_mask)
+        columns["order_offsets"].append(len(columns["order_item"]))
+
+        for name in LIST_COLUMNS:
+            ids = list_columns[name]["ids"]
+            ids.extend(strings.add(value) for value in reservation.get(name, []))
+            list_columns[name]["offsets"].append(len(ids))
+
+    output_path = Path(output_dir)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Build the export next to the target and swap it in, so files that readers have
+    # memory-mapped are never rewritten in place
+    tmp_path = _sibling_path(output_path, "tmp")
+    tmp_path.mkdir()
+    try:
+        for name, dtype in {**RESERVATION_COLUMNS, **ORDER_COLUMNS}.items():
+            np.save(tmp_path / f"{name}.npy", np.asarray(columns[name], dtype=dtype))
+        num_words = max(-(-len(dietary_tags) // ColumnarConfig.BITS_PER_WORD), 1)
+        for name in BITSET_COLUMNS:
+            np.save(tmp_path / f"{name}.npy", _to_bitset(columns[name], num_words))
+        for name, values in list_columns.items():
+            np.save(tmp_path / f"{name}_offsets.npy", np.asarray(values["offsets"], dtype=np.int64))
+            np.save(tmp_path / f"{name}_ids.npy", np.asarray(values["ids"], dtype=np.int32))
+
+        blob, offsets = strings.to_arrays()
+        np.save(tmp_path / "strings_blob.npy", blob)
+        np.save(tmp_path / "strings_offsets.npy", offsets)
+
+        meta = {
+            "format_version": ColumnarConfig.FORMAT_VERSION,
+            "source_metadata": processed_data.get("metadata", {}),
+            "num_reservations": len(reservations),
+            "num_orders": len(columns["order_item"]),
+            "num_strings": len(strings.strings),
+            "dietary_tags": sorted(dietary_tags, key=dietary_tags.get),  # Index = bit position
+            "dietary_mask_words": num_words,
+        }
+        with open(tmp_path / ColumnarConfig.META_FILE, "w") as f:
+            json.dump(meta, f, indent=2)
+        _replace_directory(tmp_path, output_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    logger.info(f"Exported {meta['num_reservations']} reservations ({meta['num_orders']} orders, "
+                f"{meta['num_strings']} unique strings) to {output_path}")
+    return output_path
+
+def export_columnar_file(input_file: str, output_dir: str) -> Path:
+    """Export a processed_output.json file into the columnar layout."""
+    logger.info(f"Reading processed file: {input_file}")
+    with open(input_file, "r") as f:
+        processed_data = json.load(f)
+    return export_columnar(processed_data, output_dir)
+
+class ColumnarReservations:
+    """
+    Memory-mapped reader for a columnar reservation export.
+
+    All columns are opened with np.load(mmap_mode='r') when the reader is created, so a reader
+    keeps a consistent snapshot if the export is replaced later. Filters and aggregates only page
+    in the numeric arrays they touch; text is decoded from the string table only when explicitly
+    requested.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        with open(self.directory / ColumnarConfig.META_FILE, "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != ColumnarConfig.FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version: {self.meta.get('format_version')}")
+        self.dietary_tags: List[str] = self.meta["dietary_tags"]
+        self._columns: Dict[str, np.ndarray] = {
+            path.stem: np.load(path, mmap_mode="r") for path in self.directory.glob("*.npy")
+        }
+
+    def __len__(self) -> int:
+        return self.meta["num_reservations"]
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped column by name (e.g. 'number_of_guests', 'order_price')"""
+        if name not in self._columns:
+            raise KeyError(f"Unknown column: {name}")
+        return self._columns[name]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    # Strings
+
+    def string(self, string_id: int) -> str:
+        """Decode a single entry of the string table"""
+        offsets = self.column("strings_offsets")
+        start, end = offsets[string_id], offsets[string_id + 1]
+        return bytes(self.column("strings_blob")[start:end]).decode("utf-8")
+
+    def strings(self, string_ids: Iterable[int]) -> List[str]:
+        return [self.string(i) for i in string_ids]
+
+    def client_names(self, rows: Optional[np.ndarray] = None) -> List[str]:
+        """Client names for the given rows (a mask or indices), or for every reservation"""
+        ids = self.column("client_name")
+        return self.strings(ids if rows is None else ids[rows])
+
+    def list_values(self, name: str, row: int) -> List[str]:
+        """Decoded special_requests or preferences of one reservation"""
+        offsets = self.column(f"{name}_offsets")
+        return self.strings(self.column(f"{name}_ids")[offsets[row]:offsets[row + 1]])
+
+    # Filters
+
+    def _tag_position(self, tag: str) -> int:
+        if tag not in self.dietary_tags:
+            raise KeyError(f"Unknown dietary tag: {tag}")
+        return self.dietary_tags.index(tag)
+
+    @staticmethod
+    def _has_bit(bitset: np.ndarray, position: int) -> np.ndarray:
+        word, bit = divmod(position, ColumnarConfig.BITS_PER_WORD)
+        return (bitset[:, word] & (np.uint64(1) << np.uint64(bit))) != 0
+
+    def has_tag(self, tag: str, column: str = "dietary_mask") -> np.ndarray:
+        """Boolean array of rows (reservations, or orders for 'order_dietary_mask') carrying `tag`"""
+        return self._has_bit(self.column(column), self._tag_position(tag))
+
+    def mask(self,
+             date: Optional[str] = None,
+             date_from: Optional[str] = None,
+             date_to: Optional[str] = None,
+             is_vip: Optional[bool] = None,
+             min_guests: Optional[int] = None,
+             dietary_tag: Optional[str] = None) -> np.ndarray:
+        """Boolean mask over reservations matching every given condition (dates are inclusive)"""
+        result = np.ones(len(self), dtype=bool)
+        dates = self.column("date")
+        if date is not None:
+            result &= dates == _date_to_int(date)
+        if date_from is not None:
+            result &= dates >= _date_to_int(date_from)
+        if date_to is not None:
+            result &= dates <= _date_to_int(date_to)
+        if is_vip is not None:
+            result &= self.column("is_vip") == is_vip
+        if min_guests is not None:
+            result &= self.column("number_of_guests") >= min_guests
+        if dietary_tag is not None:
+            result &= self.has_tag(dietary_tag)
+        return result
+
+    # Aggregates
+
+    def order_revenue(self) -> np.ndarray:
+        """Revenue (price * quantity) of every order"""
+        return self.column("order_price") * self.column("order_quantity")
+
+    def reservation_totals(self) -> np.ndarray:
+        """Order total of every reservation"""
+        return np.bincount(self.column("order_reservation"), weights=self.order_revenue(),
+                           minlength=len(self))
+
+    def _sum_per_day(self, values: np.ndarray, mask: Optional[np.ndarray]) -> Dict[str, float]:
+        dates = self.column("date")
+        if mask is not None:
+            dates, values = dates[mask], values[mask]
+        days, inverse = np.unique(dates, return_inverse=True)
+        sums = np.bincount(inverse, weights=values, minlength=len(days))
+        return {_int_to_date(day): float(total) for day, total in zip(days, sums)}
+
+    def revenue_per_day(self, mask: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Total order revenue per reservation date"""
+        return self._sum_per_day(self.reservation_totals(), mask)
+
+    def guests_per_day(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Total number of guests per reservation date"""
+        guests = self.column("number_of_guests").astype(np.float64)
+        return {day: int(total) for day, total in self._sum_per_day(guests, mask).items()}
+
+    def dietary_tag_counts(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Number of items ordered (by quantity) carrying each dietary tag"""
+        order_masks = self.column("order_dietary_mask")
+        quantities = self.column("order_quantity")
+        if mask is not None:
+            selected = mask[self.column("order_reservation")]
+            order_masks, quantities = order_masks[selected], quantities[selected]
+        counts = {}
+        for position, tag in enumerate(self.dietary_tags):
+            counts[tag] = int(quantities[self._has_bit(order_masks, position)].sum())
+        return counts
+
+    def summary(self, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Dashboard totals: revenue, guests, VIP count and dietary tag counts"""
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        return {
+            "reservations": int(mask.sum()),
+            "total_revenue": float(self.reservation_totals()[mask].sum()),
+            "total_guests": int(self.column("number_of_guests")[mask].sum()),
+            "vip_reservations": int(self.column("is_vip")[mask].sum()),
+            "dietary_tag_counts": self.dietary_tag_counts(mask),
+        }
+
+__all__ = ['export_columnar', 'export_columnar_file', 'ColumnarReservations']
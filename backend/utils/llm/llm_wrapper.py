@@ -1,10 +1,15 @@
 from dataclasses import dataclass
-from typing import Optional, Type, Any, List
+from typing import Optional, Type, Any, List, Union, Coroutine, Tuple
 import os
 import getpass
 import time
 import asyncio
 import random
+import math
+import threading
+import json
+from contextlib import contextmanager
+from pathlib import Path
 from langchain_openai import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel
@@ -16,6 +21,11 @@ class RetrySettings:
     MAX_RETRY_DELAY = 60  # seconds
     RATE_LIMIT_DELAY = 20  # seconds
 
+class HedgeSettings:
+    LATENCY_WINDOW = 200  # Recent latencies kept for the hedge threshold
+    MIN_SAMPLES = 20  # Samples needed before the percentile replaces the initial delay
+    BUDGET_WINDOW = 60  # seconds
+
 @dataclass
 class LanguageModelConfig:
     model: str = "openai"
@@ -25,6 +35,13 @@ class LanguageModelConfig:
     timeout: Optional[float] = None
     max_retries: int = RetrySettings.MAX_RETRIES
     use_async: bool = False  # Flag to control async/sync operations
+    hedge_requests: bool = False  # Fire a duplicate request when the first one is slow (async only)
+    hedge_percentile: float = 95  # Recent latency percentile after which a hedge is fired
+    hedge_initial_delay: float = 5  # seconds, used until enough latencies have been observed
+    hedge_budget_per_minute: int = 10  # Maximum hedges fired per minute
+    hedge_max_fraction: float = 0.1  # Maximum share of recent requests that may be hedged
+    hedge_control_fraction: float = 0.05  # Share of requests sent unhedged to measure the improvement
+    hedge_state_file: Optional[str] = None  # Share latencies and budget across processes through this file
 
 def calculate_backoff(attempt: int, initial_delay: float = RetrySettings.INITIAL_RETRY_DELAY) -> float:
     """Calculate exponential backoff time with jitter"""
@@ -32,6 +49,197 @@ def calculate_backoff(attempt: int, initial_delay: float = RetrySettings.INITIAL
     jitter = delay * 0.1 * random.random()  # Add 0-10% jitter
     return delay + jitter
 
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values, or None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+class HedgeTracker:
+    """
+    Latency samples, the hedge budget and hedging statistics.
+
+    State lives in memory by default. With a state file it is kept as JSON next to a lock
+    file, so short-lived processes (one per request) still share one latency history and
+    one budget. Updates hold an exclusive lock; threshold() and stats() only read it.
+    """
+
+    def __init__(self, state_file: Optional[str] = None):
+        self.state_file = Path(state_file) if state_file else None
+        self._lock = threading.Lock()
+        self._state = self._empty_state()
+
+    @staticmethod
+    def _empty_state() -> dict:
+        return {
+            "attempt_latencies": [],  # Single calls; cancelled primaries at their elapsed time
+            "request_latencies": [],  # What callers waited when hedging was allowed
+            "control_latencies": [],  # Control requests sent without hedging
+            "request_times": [],  # Start of recent requests, for the hedge fraction cap
+            "hedge_times": [],  # Recent hedges, for the per-minute budget and fraction cap
+            "stats": {"requests": 0, "control_requests": 0, "hedges_fired": 0,
+                      "hedge_wins": 0, "hedges_skipped": 0},
+        }
+
+    @staticmethod
+    def _trim(state: dict):
+        for key in ("attempt_latencies", "request_latencies", "control_latencies",
+                    "request_times", "hedge_times"):
+            del state[key][:-HedgeSettings.LATENCY_WINDOW]
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        """Yield the state, persisting changes afterwards if file-backed and write is set"""
+        with self._lock:
+            if self.state_file is None:
+                yield self._state
+                self._trim(self._state)
+            else:
+                yield from self._file_transaction(write)
+
+    def _file_transaction(self, write: bool):
+        import fcntl  # POSIX only; in-memory trackers work everywhere
+
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.state_file) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                try:
+                    with open(self.state_file, "r") as f:
+                        state = {**self._empty_state(), **json.load(f)}
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = self._empty_state()
+                yield state
+                if write:
+                    self._trim(state)
+                    with open(self.state_file, "w") as f:
+                        json.dump(state, f)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _threshold(state: dict, pct: float, initial_delay: float) -> float:
+        latencies = state["attempt_latencies"]
+        if len(latencies) < HedgeSettings.MIN_SAMPLES:
+            return initial_delay
+        return percentile(latencies, pct)
+
+    def threshold(self, pct: float, initial_delay: float) -> float:
+        """Seconds to wait on the primary request before firing a hedge"""
+        with self._transaction(write=False) as state:
+            return self._threshold(state, pct, initial_delay)
+
+    def begin_request(self, pct: float, initial_delay: float) -> float:
+        """Count a request towards the hedge fraction cap and return its hedge threshold"""
+        with self._transaction() as state:
+            state["request_times"].append(time.time())
+            return self._threshold(state, pct, initial_delay)
+
+    def reserve_hedge(self, budget_per_minute: int, max_fraction: float, reserve_request_slot) -> bool:
+        """
+        Claim one hedge if fewer than budget_per_minute were fired in the last minute, hedges
+        stay within max_fraction of the recent requests, and the shared rate limiter has room.
+        """
+        with self._transaction() as state:
+            current_time = time.time()
+            recent_requests = state["request_times"]
+            since = recent_requests[0] if recent_requests else current_time
+            recent_hedges = [t for t in state["hedge_times"] if t >= since]
+            last_minute = [t for t in recent_hedges if current_time - t <= HedgeSettings.BUDGET_WINDOW]
+            if (len(last_minute) >= budget_per_minute
+                    or len(recent_hedges) + 1 > max_fraction * len(recent_requests)
+                    or reserve_request_slot()):
+                state["stats"]["hedges_skipped"] += 1
+                return False
+            state["hedge_times"].append(current_time)
+            state["stats"]["hedges_fired"] += 1
+            return True
+
+    def record_attempt(self, latency: float):
+        with self._transaction() as state:
+            state["attempt_latencies"].append(latency)
+
+    def record_request(self, elapsed: float, attempt_latencies: List[float],
+                       hedge_won: bool = False, control: bool = False):
+        """Record a finished request and its attempt latencies in one update"""
+        with self._transaction() as state:
+            state["attempt_latencies"].extend(attempt_latencies)
+            state["stats"]["requests"] += 1
+            if control:
+                state["stats"]["control_requests"] += 1
+                state["control_latencies"].append(elapsed)
+            else:
+                state["request_latencies"].append(elapsed)
+            if hedge_won:
+                state["stats"]["hedge_wins"] += 1
+
+    def stats(self) -> dict:
+        """
+        Hedge rate and p99 latency of hedged requests compared with the control requests
+        sent without hedging. The unhedged p99 (and so the improvement) is None until
+        enough control requests have been measured.
+        """
+        with self._transaction(write=False) as state:
+            stats = dict(state["stats"])
+            p99 = percentile(state["request_latencies"], 99)
+            control = state["control_latencies"]
+            p99_unhedged = percentile(control, 99) if len(control) >= HedgeSettings.MIN_SAMPLES else None
+        stats["hedge_rate"] = stats["hedges_fired"] / stats["requests"] if stats["requests"] else 0.0
+        stats["p99_latency"] = p99
+        stats["p99_latency_unhedged"] = p99_unhedged
+        stats["p99_improvement"] = (p99_unhedged - p99) if p99 is not None and p99_unhedged is not None else None
+        return stats
+
+class BackgroundEventLoop:
+    """A single event loop running on a daemon thread.
+
+    Synchronous callers submit coroutines here instead of calling asyncio.run,
+    so the loop (and the async HTTP client bound to it) lives across calls and
+    can be shared by any number of threads.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._run_forever, args=(loop,), name="llm-event-loop", daemon=True
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    @staticmethod
+    def _run_forever(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def run(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the background loop and block until it finishes"""
+        loop = self._ensure_started()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Cannot block on the background event loop from its own thread.")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        """Stop the loop and wait for its thread to exit"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
 class LanguageModel:
     def __init__(self, config: LanguageModelConfig, structured_output: Type[BaseModel] = None):
         self.config = config
@@ -41,6 +249,10 @@ class LanguageModel:
         self._request_count = 0
         self._RATE_LIMIT_REQUESTS = 50  # Requests per minute limit
         self._RATE_LIMIT_WINDOW = 60  # Window in seconds
+        self._rate_limit_lock = threading.Lock()  # Shared by sync, async and bulk callers
+        self._event_loop = BackgroundEventLoop()
+
+        self._hedge_tracker = HedgeTracker(config.hedge_state_file)
 
         # Initialize the underlying LLM using LangChain
         _supported_models = ["openai"]
@@ -65,22 +277,35 @@ class LanguageModel:
             self._last_request_time = current_time
         return self._request_count >= self._RATE_LIMIT_REQUESTS
 
+    def _reserve_request_slot(self) -> float:
+        """
+        Claim a slot in the current rate limit window.
+        Returns 0 if the request may go ahead, otherwise the seconds to wait before trying again.
+        """
+        with self._rate_limit_lock:
+            if not self._should_rate_limit():
+                self._request_count += 1
+                return 0
+            return max(self._last_request_time + self._RATE_LIMIT_WINDOW - time.time(), 0.1)
+
     async def _handle_rate_limit(self):
-        """Handle rate limiting with exponential backoff"""
-        if self._should_rate_limit():
-            delay = RetrySettings.RATE_LIMIT_DELAY
-            print(f"Self-imposed rate limit reached. Waiting {delay} seconds...")
+        """Wait until the shared rate limiter lets this request through"""
+        while True:
+            delay = self._reserve_request_slot()
+            if not delay:
+                return
+            delay = min(delay, RetrySettings.RATE_LIMIT_DELAY)
+            print(f"Self-imposed rate limit reached. Waiting {delay:.1f} seconds...")
             await asyncio.sleep(delay)
-            self._request_count = 0
-            self._last_request_time = time.time()
 
     async def _make_request_with_retries(self, prompt: str) -> Any:
         """Make API request with retries and error handling"""
         for attempt in range(1, self.config.max_retries + 1):
             try:
                 await self._handle_rate_limit()
+                if self.config.hedge_requests:
+                    return await self._ainvoke_hedged(prompt)
                 response = await self.model.ainvoke(prompt)
-                self._request_count += 1
                 return response
             except RateLimitError as e:
                 if attempt == self.config.max_retries:
@@ -98,22 +323,86 @@ class LanguageModel:
                 print(f"Unexpected error: {str(e)}")
                 raise
 
-    def _should_rate_limit_sync(self) -> bool:
-        """Synchronous version of rate limit check"""
-        current_time = time.time()
-        if current_time - self._last_request_time > self._RATE_LIMIT_WINDOW:
-            self._request_count = 0
-            self._last_request_time = current_time
-        return self._request_count >= self._RATE_LIMIT_REQUESTS
+    async def _timed_ainvoke(self, prompt: str) -> Tuple[Any, float]:
+        """Invoke the model and return the response with the latency of the call"""
+        start = time.monotonic()
+        response = await self.model.ainvoke(prompt)
+        return response, time.monotonic() - start
+
+    async def _call_hedge_tracker(self, method, *args) -> Any:
+        """Call the hedge tracker, off the event loop when its state is in a (locked) file"""
+        if self._hedge_tracker.state_file is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def _ainvoke_hedged(self, prompt: str) -> Any:
+        """
+        Invoke the model, firing a duplicate request if the first has not returned within the
+        hedge threshold. The first successful response wins and the other request is cancelled.
+        A sample of requests (hedge_control_fraction) is sent without hedging as the baseline
+        for the reported p99 improvement.
+        """
+        start = time.monotonic()
+        threshold = await self._call_hedge_tracker(
+            self._hedge_tracker.begin_request, self.config.hedge_percentile, self.config.hedge_initial_delay
+        )
+        if random.random() < self.config.hedge_control_fraction:
+            response, latency = await self._timed_ainvoke(prompt)
+            await self._call_hedge_tracker(self._hedge_tracker.record_request, latency, [latency], False, True)
+            return response
+
+        primary = asyncio.ensure_future(self._timed_ainvoke(prompt))
+        pending = {primary}
+        hedged = False
+        try:
+            done, pending = await asyncio.wait(pending, timeout=threshold)
+            if not done and await self._call_hedge_tracker(
+                self._hedge_tracker.reserve_hedge, self.config.hedge_budget_per_minute,
+                self.config.hedge_max_fraction, self._reserve_request_slot
+            ):
+                hedged = True
+                pending.add(asyncio.ensure_future(self._timed_ainvoke(prompt)))
+
+            winner, error = None, None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = error or task.exception()
+                if winner is not None or not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if winner is None:
+                raise error
+        finally:
+            primary_cancelled = primary in pending
+            for task in pending:
+                task.cancel()
+
+        elapsed = time.monotonic() - start
+        attempt_latencies = [winner.result()[1]]
+        if primary_cancelled:
+            # Keep the slow tail in the threshold samples: the primary took at least this long
+            attempt_latencies.append(elapsed)
+        await self._call_hedge_tracker(
+            self._hedge_tracker.record_request, elapsed, attempt_latencies, hedged and winner is not primary
+        )
+        return winner.result()[0]
+
+    def get_hedge_stats(self) -> dict:
+        """Hedging statistics for this model (shared across processes with hedge_state_file)"""
+        return self._hedge_tracker.stats()
 
     def _handle_rate_limit_sync(self):
         """Synchronous version of rate limit handling"""
-        if self._should_rate_limit_sync():
-            delay = RetrySettings.RATE_LIMIT_DELAY
-            print(f"Self-imposed rate limit reached. Waiting {delay} seconds...")
+        while True:
+            delay = self._reserve_request_slot()
+            if not delay:
+                return
+            delay = min(delay, RetrySettings.RATE_LIMIT_DELAY)
+            print(f"Self-imposed rate limit reached. Waiting {delay:.1f} seconds...")
             time.sleep(delay)
-            self._request_count = 0
-            self._last_request_time = time.time()
 
     def _make_request_with_retries_sync(self, prompt: str) -> Any:
         """Synchronous version of request with retries"""
@@ -121,7 +410,6 @@ class LanguageModel:
             try:
                 self._handle_rate_limit_sync()
                 response = self.model.invoke(prompt)
-                self._request_count += 1
                 return response
             except RateLimitError as e:
                 if attempt == self.config.max_retries:
@@ -145,7 +433,33 @@ class LanguageModel:
         """
         if not self.config.use_async:
             return self._get_structured_response_sync(system_prompt)
-        return asyncio.run(self.a_get_structured_response(system_prompt))
+        return self._event_loop.run(self.a_get_structured_response(system_prompt))
+
+    def get_structured_responses(self, prompts: List[str], max_concurrency: int = 5) -> List[Union[Any, Exception]]:
+        """
+        Get structured responses for many prompts from synchronous code.
+        Requests run concurrently on the shared background event loop and go through the same
+        rate limiter as single calls. Results are returned in input order; a prompt that failed
+        yields its exception in place of a result.
+        """
+        return self._event_loop.run(self.a_get_structured_responses(prompts, max_concurrency))
+
+    async def a_get_structured_responses(self, prompts: List[str], max_concurrency: int = 5) -> List[Union[Any, Exception]]:
+        """
+        Async version of getting structured responses for many prompts
+        """
+        assert max_concurrency > 0, "max_concurrency must be positive."
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(prompt: str) -> Any:
+            async with semaphore:
+                return await self.a_get_structured_response(prompt)
+
+        return await asyncio.gather(*(_bounded(prompt) for prompt in prompts), return_exceptions=True)
+
+    def close(self):
+        """Shut down the background event loop used by the synchronous API"""
+        self._event_loop.close()
 
     def _get_structured_response_sync(self, system_prompt: str) -> Any:
         """Synchronous version of getting structured response"""
@@ -189,4 +503,4 @@ class LanguageModel:
             raise ValueError(f"Failed to parse LLM response into structured output: {str(e)}")
 
 # Export these classes
-__all__ = ['LanguageModel', 'LanguageModelConfig']
+__all__ = ['LanguageModel', 'LanguageModelConfig', 'BackgroundEventLoop', 'HedgeTracker', 'percentile']
@@ -1,11 +1,20 @@
 from typing import Dict, Any
 import logging
+import os
+from pathlib import Path
 from .llm.llm_wrapper import LanguageModel, LanguageModelConfig
 from .llm.schemas import MessageResponse
 import json
 
 logger = logging.getLogger(__name__)
 
+# Each /api/messages/generate request runs in a fresh process, so hedge latencies and budget
+# are kept in a file shared by all of them
+HEDGE_STATE_FILE = os.getenv(
+    'HEDGE_STATE_FILE',
+    str(Path(__file__).resolve().parent.parent / 'data' / 'hedge_state.json')
+)
+
 class MessageGenerator:
     """Generate contextual responses to client messages."""
     
@@ -15,7 +24,9 @@ class MessageGenerator:
             model_name="gpt-4",
             temperature=0.7,  # Slightly higher for more natural responses
             max_retries=2,
-            use_async=True
+            use_async=True,
+            hedge_requests=True,  # Interactive path: trade a little spend for lower tail latency
+            hedge_state_file=HEDGE_STATE_FILE
         )
         self.llm = LanguageModel(
             config=self.model_config,
@@ -57,6 +68,8 @@ class MessageGenerator:
         try:
             prompt = self._create_response_prompt(client_message, reservation_context)
             response = await self.llm.a_get_structured_response(prompt)
+            if self.model_config.hedge_requests:
+                logger.info(f"Hedging stats: {self.llm.get_hedge_stats()}")
             return response.suggested_reply
             
         except Exception as e:
@@ -1,14 +1,17 @@
 import json
+import hashlib
 from typing import Dict, Any, List, Optional
 import logging
 from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm  # Add progress bar support
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from itertools import islice
 import os
 
+from openai import RateLimitError, APITimeoutError
+
 from .llm.llm_wrapper import LanguageModel, LanguageModelConfig
 from .llm.schemas import ReservationOutput
 
@@ -20,6 +23,79 @@ class ProcessingConfig:
     """Configuration for batch processing"""
     BATCH_SIZE = int(os.getenv('BATCH_SIZE', '5'))  # Number of requests to process concurrently
     BATCH_DELAY = float(os.getenv('BATCH_DELAY', '6'))  # Seconds to wait between batches
+    DEAD_LETTER_SUFFIX = '.dead_letter.jsonl'  # Failed diners are written next to the output file
+    DEFAULT_CLIENT_TIMEOUT = 600  # Seconds; the OpenAI client default when the config sets no timeout
+
+class FailureCategory:
+    """Why a diner failed to process"""
+    RATE_LIMIT = 'rate_limit'
+    TIMEOUT = 'timeout'
+    PARSE_VALIDATION = 'parse_validation'
+    INPUT_SCHEMA = 'input_schema'
+    UNKNOWN = 'unknown'
+
+class InputSchemaError(ValueError):
+    """Raised when a diner record does not have the expected input structure"""
+
+@dataclass
+class RetryPolicy:
+    """How diners in one failure category are retried by retry_failed"""
+    max_attempts: int  # Total attempts including the original run
+    batch_size: int = ProcessingConfig.BATCH_SIZE
+    batch_delay: float = ProcessingConfig.BATCH_DELAY
+    timeout_multiplier: float = 1.0  # Scales the base client timeout; values below 1 are ignored
+    strict_format: bool = False  # Remind the model to return only the structured output
+
+RETRY_POLICIES = {
+    # Back off hard: one diner at a time with long pauses
+    FailureCategory.RATE_LIMIT: RetryPolicy(max_attempts=4, batch_size=1, batch_delay=ProcessingConfig.BATCH_DELAY * 3),
+    # Give slow requests more room than the original run had
+    FailureCategory.TIMEOUT: RetryPolicy(max_attempts=3, batch_size=2, timeout_multiplier=2.0),
+    FailureCategory.PARSE_VALIDATION: RetryPolicy(max_attempts=3, strict_format=True),
+    # Only succeeds if the input has been fixed in the dead-letter file; fails fast otherwise
+    FailureCategory.INPUT_SCHEMA: RetryPolicy(max_attempts=5, batch_delay=0),
+    FailureCategory.UNKNOWN: RetryPolicy(max_attempts=2),
+}
+
+def categorize_failure(error: Exception) -> str:
+    """Map an exception raised while processing a diner to a FailureCategory"""
+    if isinstance(error, InputSchemaError):
+        return FailureCategory.INPUT_SCHEMA
+    if isinstance(error, RateLimitError):
+        return FailureCategory.RATE_LIMIT
+    if isinstance(error, (APITimeoutError, asyncio.TimeoutError, TimeoutError)):
+        return FailureCategory.TIMEOUT
+    # LanguageModel wraps output parser failures (including pydantic validation) in ValueError
+    if isinstance(error, ValueError):
+        return FailureCategory.PARSE_VALIDATION
+    return FailureCategory.UNKNOWN
+
+def validate_diner(diner: Any):
+    """Check a diner record has the fields the prompt and output rely on"""
+    if not isinstance(diner, dict):
+        raise InputSchemaError(f"Diner must be an object, got {type(diner).__name__}")
+    if not isinstance(diner.get('name'), str) or not diner['name']:
+        raise InputSchemaError("Diner is missing a 'name'")
+    for key in ('reviews', 'emails'):
+        if not isinstance(diner.get(key), list):
+            raise InputSchemaError(f"Diner '{diner['name']}' is missing a '{key}' list")
+    if not isinstance(diner.get('reservations', []), list):
+        raise InputSchemaError(f"Diner '{diner['name']}' has a non-list 'reservations' field")
+
+def dead_letter_path(output_file: str) -> Path:
+    return Path(str(output_file) + ProcessingConfig.DEAD_LETTER_SUFFIX)
+
+def read_dead_letters(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_dead_letters(path: Path, entries: List[Dict[str, Any]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
 
 class ReservationProcessor:
     """Process reservations using structured LLM outputs."""
@@ -95,17 +171,38 @@ class ReservationProcessor:
         iterator = iter(items)
         return iter(lambda: list(islice(iterator, batch_size)), [])
 
+    @staticmethod
+    def _source_id(diner: Any) -> str:
+        """Stable id for a diner across runs (the built-in hash() is randomized per process)"""
+        key = {"name": diner.get("name"), "reviews": diner.get("reviews", [])} if isinstance(diner, dict) else diner
+        canonical = json.dumps(key, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _new_metadata(input_file: Optional[str]) -> Dict[str, Any]:
+        return {
+            "processed_at": datetime.now().isoformat(),
+            "input_file": input_file,
+            "total_processed": 0,
+            "successful": 0,
+            "failed": 0,
+            "failures_by_category": {},
+        }
+
+    @staticmethod
+    def _update_failure_rates(metadata: Dict[str, Any]):
+        """Per-category failure rates as a fraction of all diners processed"""
+        total = metadata["total_processed"]
+        metadata["failure_rates"] = {
+            category: (count / total if total else 0.0)
+            for category, count in metadata["failures_by_category"].items()
+        }
+
     async def process_reservations(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process all reservations."""
         try:
             processed_data = {
-                "metadata": {
-                    "processed_at": datetime.now().isoformat(),
-                    "input_file": self.input_file,
-                    "total_processed": 0,
-                    "successful": 0,
-                    "failed": 0
-                },
+                "metadata": self._new_metadata(getattr(self, "input_file", None)),
                 "reservations": []
             }
             
@@ -117,7 +214,7 @@ class ReservationProcessor:
                 # Create tasks for current batch
                 tasks = []
                 for diner in batch:
-                    source_id = str(hash(diner["name"] + str(diner.get("reviews", []))))
+                    source_id = self._source_id(diner)
                     tasks.append(self._process_single_diner(diner, source_id, processed_data))
                 
                 # Process current batch
@@ -128,18 +225,35 @@ class ReservationProcessor:
                     logger.debug(f"Completed batch {batch_num + 1}. Waiting {ProcessingConfig.BATCH_DELAY}s before next batch...")
                     await asyncio.sleep(ProcessingConfig.BATCH_DELAY)
             
+            self._update_failure_rates(processed_data["metadata"])
             return processed_data
         except Exception as e:
             logger.error(f"Error processing reservations: {str(e)}")
             raise
 
-    async def _process_single_diner(self, diner: Dict[str, Any], source_id: str, processed_data: Dict[str, Any]):
-        """Process a single diner."""
+    async def _process_single_diner(self,
+                                    diner: Dict[str, Any],
+                                    source_id: str,
+                                    processed_data: Dict[str, Any],
+                                    dead_letters: Optional[List[Dict[str, Any]]] = None,
+                                    llm: Optional[LanguageModel] = None,
+                                    strict_format: bool = False,
+                                    attempts: int = 1):
+        """
+        Process a single diner. Failures are counted by category in the metadata and, if
+        `dead_letters` is given, recorded there together with the offending input.
+        """
         try:
+            validate_diner(diner)
+            prompt = self._create_client_prompt(diner)
+            if strict_format:
+                prompt += """
+        Your previous answer for this client could not be parsed. Respond with ONLY the
+        structured output described below, with no extra text, and make sure every field is valid.
+        """
+
             # First get LLM processed data
-            llm_processed = await self.llm.a_get_structured_response(
-                self._create_client_prompt(diner)
-            )
+            llm_processed = await (llm or self.llm).a_get_structured_response(prompt)
             
             # Then create the final reservation object
             processed_reservation = {
@@ -157,8 +271,22 @@ class ReservationProcessor:
             processed_data["metadata"]["successful"] += 1
             
         except Exception as e:
-            logger.error(f"Failed to process {diner['name']}: {str(e)}")
-            processed_data["metadata"]["failed"] += 1
+            category = categorize_failure(e)
+            name = diner.get('name', 'Unknown') if isinstance(diner, dict) else 'Unknown'
+            logger.error(f"Failed to process {name} ({category}): {str(e)}")
+            metadata = processed_data["metadata"]
+            metadata["failed"] += 1
+            metadata["failures_by_category"][category] = metadata["failures_by_category"].get(category, 0) + 1
+            if dead_letters is not None:
+                dead_letters.append({
+                    "source_id": source_id,
+                    "category": category,
+                    "error_type": type(e).__name__,
+                    "error": str(e),
+                    "failed_at": datetime.now().isoformat(),
+                    "attempts": attempts,
+                    "diner": diner,
+                })
         finally:
             processed_data["metadata"]["total_processed"] += 1
 
@@ -173,15 +301,10 @@ class ReservationProcessor:
             logger.info(f"Found {total_diners} diners to process")
             
             processed_data = {
-                'metadata': {
-                    'processed_at': datetime.now().isoformat(),
-                    'input_file': input_file,
-                    'total_processed': 0,
-                    'successful': 0,
-                    'failed': 0
-                },
+                'metadata': self._new_metadata(input_file),
                 'reservations': []
             }
+            dead_letters = []
             
             # Process diners with progress bar
             with tqdm(total=total_diners, desc="Processing reservations") as pbar:
@@ -190,8 +313,10 @@ class ReservationProcessor:
                     # Create tasks for current batch
                     batch_tasks = []
                     for client in batch:
-                        source_id = str(hash(client["name"] + str(client.get("reviews", []))))
-                        task = asyncio.create_task(self._process_single_diner(client, source_id, processed_data))
+                        source_id = self._source_id(client)
+                        task = asyncio.create_task(
+                            self._process_single_diner(client, source_id, processed_data, dead_letters)
+                        )
                         task.add_done_callback(lambda _: pbar.update(1))
                         batch_tasks.append(task)
                     
@@ -202,20 +327,131 @@ class ReservationProcessor:
                     if len(batch) == ProcessingConfig.BATCH_SIZE:
                         await asyncio.sleep(ProcessingConfig.BATCH_DELAY)
             
-            # Save processed data
-            logger.info(f"Saving processed data to {output_file}")
-            output_path = Path(output_file)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(output_file, 'w') as f:
-                json.dump(processed_data, f, indent=2)
+            # Save processed data and the dead-letter file
+            dead_letter_file = dead_letter_path(output_file)
+            processed_data['metadata']['dead_letter_file'] = str(dead_letter_file)
+            self._update_failure_rates(processed_data['metadata'])
+            self._save_output(processed_data, output_file)
+            write_dead_letters(dead_letter_file, dead_letters)
             
             # Log final statistics
             logger.info(f"Processing complete:")
             logger.info(f"Total processed: {processed_data['metadata']['total_processed']}")
             logger.info(f"Successful: {processed_data['metadata']['successful']}")
             logger.info(f"Failed: {processed_data['metadata']['failed']}")
+            if dead_letters:
+                logger.info(f"Failures by category: {processed_data['metadata']['failures_by_category']}")
+                logger.info(f"Failed diners written to {dead_letter_file}")
             
         except Exception as e:
             logger.error(f"Error processing reservations: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+
+    @staticmethod
+    def _save_output(processed_data: Dict[str, Any], output_file: str):
+        logger.info(f"Saving processed data to {output_file}")
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, 'w') as f:
+            json.dump(processed_data, f, indent=2)
+
+    def _retry_timeout(self, policy: RetryPolicy) -> Optional[float]:
+        """Client timeout for a retry policy, never lower than the one the run used"""
+        if policy.timeout_multiplier <= 1:
+            return self.model_config.timeout
+        base = self.model_config.timeout or ProcessingConfig.DEFAULT_CLIENT_TIMEOUT
+        return base * policy.timeout_multiplier
+
+    def _llm_for_policy(self, policy: RetryPolicy) -> LanguageModel:
+        timeout = self._retry_timeout(policy)
+        if timeout == self.model_config.timeout:
+            return self.llm
+        return LanguageModel(
+            config=replace(self.model_config, timeout=timeout),
+            structured_output=ReservationOutput
+        )
+
+    async def retry_failed(self, output_file: str, dead_letter_file: Optional[str] = None):
+        """
+        Reprocess only the diners in the dead-letter file, using the retry policy of each
+        failure category, and merge successes into the existing output file.
+        Diners that fail again stay in the dead-letter file with their attempt count increased.
+        """
+        try:
+            dead_letter_file = Path(dead_letter_file) if dead_letter_file else dead_letter_path(output_file)
+            entries = read_dead_letters(dead_letter_file)
+            if not entries:
+                logger.info(f"No failed diners found in {dead_letter_file}")
+                return
+
+            logger.info(f"Reading processed file: {output_file}")
+            with open(output_file, 'r') as f:
+                processed_data = json.load(f)
+            metadata = processed_data['metadata']
+            metadata.setdefault('failures_by_category', {})
+
+            # Diners that failed this run are counted in a scratch metadata block
+            retry_data = {'metadata': self._new_metadata(metadata.get('input_file')), 'reservations': []}
+            remaining = []
+
+            by_category: Dict[str, List[Dict[str, Any]]] = {}
+            for entry in entries:
+                by_category.setdefault(entry.get('category', FailureCategory.UNKNOWN), []).append(entry)
+
+            for category, category_entries in by_category.items():
+                policy = RETRY_POLICIES.get(category, RETRY_POLICIES[FailureCategory.UNKNOWN])
+                retryable = [e for e in category_entries if e.get('attempts', 1) < policy.max_attempts]
+                exhausted = [e for e in category_entries if e.get('attempts', 1) >= policy.max_attempts]
+                remaining.extend(exhausted)
+                if exhausted:
+                    logger.info(f"Skipping {len(exhausted)} {category} failures that reached "
+                                f"{policy.max_attempts} attempts")
+                if not retryable:
+                    continue
+
+                logger.info(f"Retrying {len(retryable)} {category} failures")
+                llm = self._llm_for_policy(policy)
+                with tqdm(total=len(retryable), desc=f"Retrying {category}") as pbar:
+                    for batch_num, batch in enumerate(self.batch_items(retryable, policy.batch_size)):
+                        if batch_num and policy.batch_delay:
+                            await asyncio.sleep(policy.batch_delay)
+                        tasks = []
+                        for entry in batch:
+                            task = asyncio.create_task(self._process_single_diner(
+                                entry['diner'], entry['source_id'], retry_data, remaining,
+                                llm=llm, strict_format=policy.strict_format,
+                                attempts=entry.get('attempts', 1) + 1,
+                            ))
+                            task.add_done_callback(lambda _: pbar.update(1))
+                            tasks.append(task)
+                        await asyncio.gather(*tasks)
+
+            # Merge: recovered diners replace any stale copy with the same source_id
+            recovered = {r['source_id']: r for r in retry_data['reservations']}
+            processed_data['reservations'] = [
+                r for r in processed_data['reservations'] if r.get('source_id') not in recovered
+            ] + list(recovered.values())
+
+            # Failures are re-counted from what is still in the dead-letter file
+            metadata['successful'] += len(recovered)
+            metadata['failed'] = len(remaining)
+            metadata['failures_by_category'] = {}
+            for entry in remaining:
+                category = entry.get('category', FailureCategory.UNKNOWN)
+                metadata['failures_by_category'][category] = metadata['failures_by_category'].get(category, 0) + 1
+            metadata['dead_letter_file'] = str(dead_letter_file)
+            metadata['last_retry_at'] = datetime.now().isoformat()
+            metadata['retried'] = metadata.get('retried', 0) + retry_data['metadata']['total_processed']
+            self._update_failure_rates(metadata)
+
+            self._save_output(processed_data, output_file)
+            write_dead_letters(dead_letter_file, remaining)
+
+            logger.info(f"Retry complete:")
+            logger.info(f"Recovered: {len(recovered)}")
+            logger.info(f"Still failing: {len(remaining)}")
+            logger.info(f"Failures by category: {metadata['failures_by_category']}")
+
+        except Exception as e:
+            logger.error(f"Error retrying failed reservations: {str(e)}")
+            raise
\ No newline at end of file
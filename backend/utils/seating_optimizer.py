@@ -0,0 +1,418 @@
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Union
+import logging
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+class SeatingConfig:
+    """Weights and limits for the seating optimizer"""
+    WASTE_WEIGHT = 1.0  # Cost per empty seat at an assigned table
+    PREFERENCE_WEIGHT = 3.0  # Reward per satisfied table preference
+    VIP_PREFERENCE_MULTIPLIER = 3.0  # VIP preferences count this much more
+    COMBINATION_PENALTY = 1.5  # Cost of pushing tables together
+    SHIFT_STEP_MINUTES = 30  # Granularity when moving a party to a later turn
+    MAX_SHIFT_MINUTES = 90  # Never move a party more than this past its requested time
+    MAX_AUGMENT_CANDIDATES = 25  # Seated parties tried per start time when making room
+
+# Table feature -> whole-word patterns in preferences/special_requests that ask for it.
+# Adjectives like "quiet" only count when they describe the seating, so that e.g. a quiet
+# "Happy Birthday" is not read as a quiet-table request.
+_SETTING = r"(?:table|corner|area|spot|section|seating|seat|room|booth|environment|atmosphere|setting|dining|place)s?"
+FEATURE_PATTERNS = {
+    "quiet": [rf"\bquiet(?:er)?\s+{_SETTING}\b", rf"\b(?:calm|peaceful|intimate)\s+{_SETTING}\b"],
+    "corner": [r"\bcorner\b"],
+    "window": [r"\bwindows?\b", r"\b(?:a|the)\s+view\b"],
+    "booth": [r"\bbooths?\b"],
+    "private": [r"\b(?:semi-)?private\b", r"\bvip\s+room\b", r"\bsecluded\b"],
+    "patio": [r"\bpatio\b", r"\boutdoors?\b", r"\bterrace\b"],
+    # \b keeps "inaccessible" from matching
+    "accessible": [r"\bwheelchair\b", r"\baccessib(?:le|ility)\b", r"\beasy\s+to\s+navigate\b",
+                   r"\bmobility\b", r"\bcane\b", r"\bwalker\b"],
+}
+REQUIRED_FEATURES = {"accessible"}  # Hard constraints; everything else is a soft preference
+
+_FEATURE_PATTERNS = {
+    feature: re.compile("|".join(patterns), re.IGNORECASE)
+    for feature, patterns in FEATURE_PATTERNS.items()
+}
+
+def parse_time(value: Union[str, int]) -> int:
+    """'19:30' -> minutes since midnight"""
+    if isinstance(value, int):
+        return value
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def extract_table_preferences(reservation: Dict[str, Any]) -> Tuple[set, set]:
+    """Table features asked for in preferences/special_requests, split into (required, preferred)"""
+    text = " ".join(reservation.get("preferences", []) + reservation.get("special_requests", []))
+    wanted = {feature for feature, pattern in _FEATURE_PATTERNS.items() if pattern.search(text)}
+    return wanted & REQUIRED_FEATURES, wanted - REQUIRED_FEATURES
+
+def reservation_key(reservation: Dict[str, Any]) -> str:
+    """
+    Key of a reservation in a seating plan, rebuilt from the reservation alone so that an
+    edited copy replaces the original. Processed reservations carry a unique source_id;
+    otherwise the client name is qualified by date and requested time.
+    """
+    if reservation.get("source_id"):
+        return reservation["source_id"]
+    parts = [reservation["client_name"], reservation.get("date"), reservation.get("time")]
+    return " ".join(str(part) for part in parts if part)
+
+@dataclass
+class Table:
+    table_id: str
+    capacity: int
+    features: set = field(default_factory=set)
+
+@dataclass
+class FloorPlan:
+    """Tables, the groups of tables that can be pushed together, and service hours."""
+    tables: List[Table]
+    combinations: List[List[str]] = field(default_factory=list)
+    service_start: str = "17:00"
+    service_end: str = "23:00"
+    turn_minutes: int = 120  # How long a party holds a table
+    large_party_size: int = 6
+    large_party_turn_minutes: int = 150
+
+    def turn_for(self, party_size: int) -> int:
+        if party_size >= self.large_party_size:
+            return self.large_party_turn_minutes
+        return self.turn_minutes
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FloorPlan":
+        tables = [Table(t["table_id"], t["capacity"], set(t.get("features", []))) for t in data["tables"]]
+        return cls(tables=tables, **{k: v for k, v in data.items() if k != "tables"})
+
+@dataclass
+class Party:
+    key: str
+    size: int
+    start: int  # Requested start, minutes since midnight
+    is_vip: bool
+    required: set
+    preferred: set
+    reservation: Dict[str, Any]
+    flexible: bool = False  # No requested time: any start from `start` until closing will do
+
+@dataclass
+class Assignment:
+    key: str
+    table_ids: Tuple[str, ...]
+    start: int
+    end: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "reservation": self.key,
+            "tables": list(self.table_ids),
+            "start": format_time(self.start),
+            "end": format_time(self.end),
+        }
+
+class _Unit:
+    """A single table or a combination of tables that can seat one party."""
+
+    def __init__(self, tables: List[Table]):
+        self.table_ids = tuple(t.table_id for t in tables)
+        self.capacity = sum(t.capacity for t in tables)
+        # A combination only offers a feature every member table has
+        self.features = set.intersection(*(t.features for t in tables))
+        self.is_combination = len(tables) > 1
+
+class _IntervalIndex:
+    """Disjoint [start, end) bookings of one table, kept sorted for O(log n) conflict checks."""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.keys: List[str] = []  # Reservation holding each booking
+
+    def is_free(self, start: int, end: int) -> bool:
+        i = bisect_right(self.ends, start)  # First booking ending after `start`
+        return i == len(self.starts) or self.starts[i] >= end
+
+    def overlapping(self, start: int, end: int) -> List[str]:
+        """Reservations whose bookings overlap [start, end)"""
+        keys = []
+        i = bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            keys.append(self.keys[i])
+            i += 1
+        return keys
+
+    def add(self, start: int, end: int, key: str):
+        # Bookings are disjoint, so one position keeps starts and ends sorted
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.keys.insert(i, key)
+
+    def remove(self, start: int, end: int):
+        i = bisect_left(self.starts, start)
+        del self.starts[i]
+        del self.ends[i]
+        del self.keys[i]
+
+    def clear(self):
+        self.starts.clear()
+        self.ends.clear()
+        self.keys.clear()
+
+class SeatingPlan:
+    """
+    Table assignments for one night.
+
+    Parties are seated in priority order (VIP first, then parties with a requested time, then
+    larger parties, then earlier requests) onto the cheapest feasible unit, where cost trades
+    off empty seats against satisfied preferences. Availability is checked against a per-table
+    interval index, and a party that fits nowhere gets one augmenting step: an overlapping
+    party is moved to another free unit at the same time if that frees a slot. The plan can be
+    updated one reservation at a time without re-solving the night.
+    """
+
+    def __init__(self, floor_plan: FloorPlan):
+        self.floor_plan = floor_plan
+        self._service_start = parse_time(floor_plan.service_start)
+        self._service_end = parse_time(floor_plan.service_end)
+
+        tables = {t.table_id: t for t in floor_plan.tables}
+        units = [_Unit([t]) for t in floor_plan.tables]
+        for combination in floor_plan.combinations:
+            units.append(_Unit([tables[table_id] for table_id in combination]))
+        self._units = sorted(units, key=lambda u: (u.capacity, u.is_combination))
+        self._unit_capacities = [u.capacity for u in self._units]
+        self._units_by_table: Dict[str, List[_Unit]] = {table_id: [] for table_id in tables}
+        for unit in self._units:
+            for table_id in unit.table_ids:
+                self._units_by_table[table_id].append(unit)
+        self._index = {table_id: _IntervalIndex() for table_id in tables}
+
+        self.parties: Dict[str, Party] = {}
+        self.assignments: Dict[str, Assignment] = {}
+        self.unseated: List[str] = []
+
+    # Availability
+
+    def _unit_free(self, unit: _Unit, start: int, end: int) -> bool:
+        return all(self._index[t].is_free(start, end) for t in unit.table_ids)
+
+    def _book(self, assignment: Assignment):
+        for table_id in assignment.table_ids:
+            self._index[table_id].add(assignment.start, assignment.end, assignment.key)
+        self.assignments[assignment.key] = assignment
+
+    def _release(self, key: str) -> Optional[Assignment]:
+        assignment = self.assignments.pop(key, None)
+        if assignment is not None:
+            for table_id in assignment.table_ids:
+                self._index[table_id].remove(assignment.start, assignment.end)
+        return assignment
+
+    # Search
+
+    def _unit_cost(self, party: Party, unit: _Unit) -> Optional[float]:
+        if not party.required <= unit.features:
+            return None
+        reward = SeatingConfig.PREFERENCE_WEIGHT * len(party.preferred & unit.features)
+        if party.is_vip:
+            reward *= SeatingConfig.VIP_PREFERENCE_MULTIPLIER
+        cost = SeatingConfig.WASTE_WEIGHT * (unit.capacity - party.size) - reward
+        if unit.is_combination:
+            cost += SeatingConfig.COMBINATION_PENALTY
+        return cost
+
+    def _max_reward(self, party: Party) -> float:
+        reward = SeatingConfig.PREFERENCE_WEIGHT * len(party.preferred)
+        return reward * SeatingConfig.VIP_PREFERENCE_MULTIPLIER if party.is_vip else reward
+
+    def _candidate_starts(self, party: Party) -> Iterable[int]:
+        last_start = self._service_end - self.floor_plan.turn_for(party.size)
+        start = max(party.start, self._service_start)
+        limit = last_start if party.flexible else min(start + SeatingConfig.MAX_SHIFT_MINUTES, last_start)
+        while start <= limit:
+            yield start
+            start += SeatingConfig.SHIFT_STEP_MINUTES
+
+    def _best_unit(self, party: Party, start: int, end: int,
+                   units: Optional[List[_Unit]] = None) -> Optional[_Unit]:
+        """
+        Cheapest free unit for the party, scanning capacities upward with pruning.
+        `units` restricts the search to a capacity-sorted subset of the floor plan.
+        """
+        best, best_cost = None, float("inf")
+        max_reward = self._max_reward(party)
+        if units is None:
+            units = self._units[bisect_left(self._unit_capacities, party.size):]
+        for unit in units:
+            if unit.capacity < party.size:
+                continue
+            # Larger units only add empty seats; stop once they cannot beat the best so far
+            if SeatingConfig.WASTE_WEIGHT * (unit.capacity - party.size) - max_reward >= best_cost:
+                break
+            cost = self._unit_cost(party, unit)
+            if cost is not None and cost < best_cost and self._unit_free(unit, start, end):
+                best, best_cost = unit, cost
+        return best
+
+    def _try_seat(self, party: Party) -> bool:
+        turn = self.floor_plan.turn_for(party.size)
+        for start in self._candidate_starts(party):
+            unit = self._best_unit(party, start, start + turn)
+            if unit is not None:
+                self._book(Assignment(party.key, unit.table_ids, start, start + turn))
+                return True
+        return False
+
+    def _touching_units(self, party: Party, table_ids: Tuple[str, ...]) -> List[_Unit]:
+        """Units sharing a table with `table_ids` that could seat the party, by capacity"""
+        units = {id(u): u for t in table_ids for u in self._units_by_table[t]
+                 if u.capacity >= party.size and party.required <= u.features}
+        return sorted(units.values(), key=lambda u: (u.capacity, u.is_combination))
+
+    def _blocking_parties(self, party: Party, start: int, end: int) -> List[str]:
+        """
+        Seated parties holding, during [start, end), a table of some unit that could seat
+        `party`, found through the per-table interval indexes.
+        """
+        keys, seen_tables = {}, set()
+        for unit in self._units[bisect_left(self._unit_capacities, party.size):]:
+            if not party.required <= unit.features:
+                continue
+            for table_id in unit.table_ids:
+                if table_id in seen_tables:
+                    continue
+                seen_tables.add(table_id)
+                for key in self._index[table_id].overlapping(start, end):
+                    keys.setdefault(key, None)
+        return list(keys)
+
+    def _try_augment(self, party: Party) -> bool:
+        """Move one overlapping party to another free unit if that frees room for `party`."""
+        turn = self.floor_plan.turn_for(party.size)
+        for start in self._candidate_starts(party):
+            end = start + turn
+            candidates = []
+            for other_key in self._blocking_parties(party, start, end):
+                other = self.assignments[other_key]
+                # Releasing `other` only changes availability of units sharing its tables
+                touching = self._touching_units(party, other.table_ids)
+                if touching:
+                    candidates.append((other_key, other, touching))
+                    if len(candidates) == SeatingConfig.MAX_AUGMENT_CANDIDATES:
+                        break
+            for other_key, other, touching in candidates:
+                other_party = self.parties[other_key]
+                self._release(other_key)
+                unit = self._best_unit(party, start, end, touching)
+                if unit is not None:
+                    self._book(Assignment(party.key, unit.table_ids, start, end))
+                    # The moved party keeps its time and only changes tables
+                    moved = self._best_unit(other_party, other.start, other.end)
+                    if moved is not None:
+                        self._book(Assignment(other_key, moved.table_ids, other.start, other.end))
+                        return True
+                    self._release(party.key)
+                self._book(other)
+        return False
+
+    def _seat(self, party: Party):
+        if self._try_seat(party) or self._try_augment(party):
+            return
+        self.unseated.append(party.key)
+
+    # Public API
+
+    def solve(self, parties: List[Party]):
+        """Seat a night's parties from scratch."""
+        for table_index in self._index.values():
+            table_index.clear()
+        self.parties = {p.key: p for p in parties}
+        self.assignments = {}
+        self.unseated = []
+        for party in sorted(parties, key=lambda p: (not p.is_vip, p.flexible, -p.size, p.start)):
+            self._seat(party)
+
+    def update(self, party: Party):
+        """Add or change one reservation, leaving every other assignment in place."""
+        self.remove(party.key)
+        self.parties[party.key] = party
+        self._seat(party)
+        # A change may free room for parties that could not be seated before
+        for key in list(self.unseated):
+            if key != party.key and self._try_seat(self.parties[key]):
+                self.unseated.remove(key)
+
+    def remove(self, key: str):
+        """Drop a reservation and free its tables."""
+        self._release(key)
+        self.parties.pop(key, None)
+        if key in self.unseated:
+            self.unseated.remove(key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        seated_covers = sum(self.parties[k].size for k in self.assignments)
+        return {
+            "assignments": [a.to_dict() for a in sorted(self.assignments.values(), key=lambda a: (a.start, a.table_ids))],
+            "unseated": list(self.unseated),
+            "seated_covers": seated_covers,
+            "total_covers": sum(p.size for p in self.parties.values()),
+        }
+
+class SeatingOptimizer:
+    """Assign a night's processed reservations to tables on a floor plan."""
+
+    def __init__(self, floor_plan: FloorPlan, default_time: Optional[str] = None):
+        self.floor_plan = floor_plan
+        self.default_time = default_time or floor_plan.service_start
+
+    def to_party(self, reservation: Any, key: Optional[str] = None) -> Party:
+        """Build a Party from a ReservationOutput or a processed reservation dict"""
+        if hasattr(reservation, "model_dump"):
+            reservation = reservation.model_dump()
+        required, preferred = extract_table_preferences(reservation)
+        return Party(
+            key=key or reservation_key(reservation),
+            size=reservation["number_of_guests"],
+            start=parse_time(reservation.get("time") or self.default_time),
+            is_vip=reservation.get("is_vip", False),
+            required=required,
+            preferred=preferred,
+            reservation=reservation,
+            flexible=not reservation.get("time"),
+        )
+
+    def solve(self, reservations: List[Any], date: Optional[str] = None) -> SeatingPlan:
+        """
+        Seat reservations, optionally keeping only those on `date`. Reservations without a
+        'time' field (ReservationOutput has none) may start at any turn from `default_time`
+        until closing.
+        """
+        parties, seen = [], {}
+        for reservation in reservations:
+            party = self.to_party(reservation)
+            if date is not None and party.reservation.get("date") != date:
+                continue
+            seen[party.key] = seen.get(party.key, 0) + 1
+            if seen[party.key] > 1:
+                # Indistinguishable copies; only the first can be updated through to_party
+                logger.warning(f"Reservation {party.key} appears {seen[party.key]} times")
+                party.key = f"{party.key}#{seen[party.key]}"
+            parties.append(party)
+
+        plan = SeatingPlan(self.floor_plan)
+        plan.solve(parties)
+        logger.info(f"Seated {len(plan.assignments)}/{len(parties)} parties "
+                    f"({plan.to_dict()['seated_covers']} covers), {len(plan.unseated)} unseated")
+        return plan
+
+__all__ = ['FloorPlan', 'Table', 'Party', 'Assignment', 'SeatingPlan', 'SeatingOptimizer',
+           'extract_table_preferences', 'reservation_key']
@@ -11,5 +11,6 @@ setup(
         "openai",
         "python-dotenv",
         "pydantic>=2.0.0",
+        "numpy",
     ]
 ) 
\ No newline at end of file